@@ -9,11 +9,19 @@ async def setup():
 
 
 async def process_message(sidekick, message, success_criteria, history):
-    results = await sidekick.run_superstep(message, success_criteria, history)
-    return results, sidekick
+    async for results in sidekick.run_superstep(message, success_criteria, history):
+        yield results, sidekick
 
 
-async def reset():
+async def stop(sidekick):
+    if sidekick:
+        sidekick.stop()
+
+
+async def reset(sidekick):
+    # The old session is never resumed, so give back its browser context and checkpoints as well
+    if sidekick:
+        await sidekick.close()
     new_sidekick = Sidekick()
     await new_sidekick.setup()
     return "", "", None, new_sidekick
@@ -43,19 +51,22 @@ with gr.Blocks(title="Sidekick", theme=gr.themes.Default(primary_hue="emerald"))
             )
     with gr.Row():
         reset_button = gr.Button("Reset", variant="stop")
+        stop_button = gr.Button("Stop", variant="secondary")
         go_button = gr.Button("Go!", variant="primary")
 
     ui.load(setup, [], [sidekick])
+    # The graph is async end to end, so sessions can run side by side instead of queueing one at a time
     message.submit(
-        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick]
+        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick], concurrency_limit=None
     )
     success_criteria.submit(
-        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick]
+        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick], concurrency_limit=None
     )
     go_button.click(
-        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick]
+        process_message, [sidekick, message, success_criteria, chatbot], [chatbot, sidekick], concurrency_limit=None
     )
-    reset_button.click(reset, [], [message, success_criteria, chatbot, sidekick])
+    stop_button.click(stop, [sidekick], [], concurrency_limit=None)
+    reset_button.click(reset, [sidekick], [message, success_criteria, chatbot, sidekick])
 
 
 ui.launch(inbrowser=True)
@@ -0,0 +1,101 @@
+"""
+Measures what each Sidekick session costs to start: N sessions are set up one after another, each
+leasing its browser context as its first browse would, and the script reports the setup latency and
+the resident memory of this process and its children (the Playwright driver and Chromium) as the
+sessions accumulate. With --per-session-browser, each session launches its own Chromium instead, as
+sessions did before they shared one, for comparison; the shared Chromium the tools start is still
+running then, so compare how memory grows per session rather than the totals.
+
+It needs the same .env as the app (the tools and LLM clients are built, though no model is called)
+and Playwright's Chromium (uv run playwright install chromium). Where Chromium cannot be installed,
+--no-browser stands in for the shared browser's launch and leases no contexts, so nothing is
+launched and the figures are only for the Python side. RSS summed over Chromium's processes counts the pages
+they share more than once, so it overstates the browser's total a little.
+
+Usage: uv run bench_sidekick_sessions.py [--sessions 20] [--per-session-browser | --no-browser]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import psutil
+
+os.environ["SIDEKICK_MEMORY_DB"] = os.path.join(tempfile.gettempdir(), "bench_sidekick_sessions.db")
+
+from playwright.async_api import async_playwright
+from sidekick import Sidekick
+from sidekick_tools import browser_pool, HEADLESS
+
+MIB = 1024 * 1024
+
+
+def rss() -> tuple[float, float]:
+    """Resident memory in MiB of this process, and of its children together."""
+    process = psutil.Process()
+    children = 0
+    for child in process.children(recursive=True):
+        try:
+            children += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return process.memory_info().rss / MIB, children / MIB
+
+
+async def main(sessions: int, per_session_browser: bool, browse: bool) -> None:
+    sidekicks, browsers, timings, last = [], [], [], None
+    if not browse:
+        async def no_browser():
+            return None
+
+        # The tools only reach the browser through the pool, and never will here
+        browser_pool.start = no_browser
+    playwright = await async_playwright().start() if per_session_browser else None
+    base_python, base_children = rss()
+    print(f"{'sessions':>8} {'setup ms':>9} {'python MiB':>11} {'children MiB':>13}")
+    try:
+        for n in range(1, sessions + 1):
+            start = time.perf_counter()
+            sidekick = Sidekick()
+            await sidekick.setup()
+            if per_session_browser:
+                browser = await playwright.chromium.launch(headless=HEADLESS)
+                browsers.append(browser)
+                await browser.new_context()
+            elif browse:
+                await browser_pool.lease(sidekick.sidekick_id)
+            timings.append(time.perf_counter() - start)
+            sidekicks.append(sidekick)
+            python, children = last = rss()
+            if n == 1 or n == sessions or n % 5 == 0:
+                print(f"{n:>8} {1000 * timings[-1]:>9.2f} {python:>11.1f} {children:>13.1f}")
+    finally:
+        for sidekick in sidekicks:
+            await sidekick.close()
+        for browser in browsers:
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+        if Sidekick.shared:
+            await Sidekick.shared.memory_ctx.__aexit__(None, None, None)
+        if browser_pool.browser:
+            await browser_pool.browser.close()
+        if browser_pool.playwright:
+            await browser_pool.playwright.stop()
+
+    later = timings[1:] or timings
+    print(f"First setup {1000 * timings[0]:.1f}ms (builds what sessions share), then median {1000 * statistics.median(later):.2f}ms")
+    python, children = last
+    print(f"With {len(sidekicks)} sessions open: python {python - base_python:+.1f} MiB, children {children - base_children:+.1f} MiB over the start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time Sidekick session setup and measure the memory each session adds")
+    parser.add_argument("--sessions", type=int, default=20)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--per-session-browser", action="store_true", help="Launch a Chromium per session, as before")
+    mode.add_argument("--no-browser", action="store_true", help="Don't lease browser contexts, where Chromium can't run")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.per_session_browser, not args.no_browser))
@@ -5,17 +5,30 @@ from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
 from langgraph.prebuilt import ToolNode
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage, RemoveMessage
 from typing import List, Any, Optional, Dict
 from pydantic import BaseModel, Field
-from sidekick_tools import playwright_tools, other_tools
+from sidekick_tools import playwright_tools, other_tools, browser_pool, current_session
+from sidekick_memory import PrunedSqliteSaver, MEMORY_DB
 import uuid
 import asyncio
+import os
 from datetime import datetime
 
 load_dotenv(override=True)
 
+# The context node keeps the last CONTEXT_TURNS exchanges with the user verbatim and folds anything
+# older into a running summary. Each node's prompt is also cut to its token budget, counted roughly
+# at four characters a token, by dropping the oldest messages first, though never the user's latest
+# message, which the rest of the turn answers.
+
+CONTEXT_TURNS = int(os.getenv("SIDEKICK_CONTEXT_TURNS", "4"))
+TOKEN_BUDGETS = {
+    node: int(os.getenv(f"SIDEKICK_{node.upper()}_TOKEN_BUDGET", default))
+    for node, default in [("worker", "12000"), ("planner", "4000"), ("evaluator", "6000"), ("summary", "4000")]
+}
+CHATTER_PREFIXES = ("Plan generated.", "Planner Feedback on this plan:", "Evaluator Feedback on this answer:")
+
 
 class EvaluatorOutput(BaseModel):
     feedback: str = Field(description="Feedback on the assistant's response")
@@ -46,9 +59,77 @@ class State(TypedDict):
     plan: Optional[PlanOutput] = None
     final_worker_response: Optional[str]
     engagement_questions: Optional[str]
+    summary: Optional[str]
+
+
+def is_chatter(message: Any) -> bool:
+    """The planner's and evaluators' notes, which are kept in the state's own fields as well."""
+    return isinstance(message, AIMessage) and str(message.content).startswith(CHATTER_PREFIXES)
+
+
+def count_tokens(message: Any) -> int:
+    return len(str(message.content)) // 4 + 1
+
+
+def fit_to_budget(messages: List[Any], budget: int) -> List[Any]:
+    """
+    The most recent messages that fit in budget tokens, each cut to at most half the budget. Never
+    starts on a tool result, whose tool call would be missing.
+    """
+    limit = budget * 2
+    fitted, used = [], 0
+    for message in reversed(messages):
+        if len(str(message.content)) > limit:
+            message = message.model_copy(update={"content": str(message.content)[:limit] + "\n[truncated]"})
+        used += count_tokens(message)
+        if used > budget and fitted:
+            break
+        fitted.append(message)
+    fitted.reverse()
+    while fitted and isinstance(fitted[0], ToolMessage):
+        fitted.pop(0)
+    return fitted
+
+
+def fit_turn_to_budget(messages: List[Any], budget: int) -> List[Any]:
+    """
+    fit_to_budget, but always keeping the user's latest message: the rest of its turn is fitted
+    in what that leaves, and earlier turns only if all of its turn fits.
+    """
+    last = next((i for i in reversed(range(len(messages))) if isinstance(messages[i], HumanMessage)), None)
+    if last is None:
+        return fit_to_budget(messages, budget)
+    request = fit_to_budget([messages[last]], budget)
+    budget -= count_tokens(request[0])
+    after = fit_to_budget(messages[last + 1:], budget)
+    if len(after) < len(messages) - last - 1:
+        return request + after
+    before = fit_to_budget(messages[:last], budget - sum(count_tokens(message) for message in after))
+    return before + request + after
+
+
+def is_conversation(message: Any) -> bool:
+    """The messages format_conversation shows: the user's and the assistant's, not tool results."""
+    return isinstance(message, (HumanMessage, AIMessage))
+
+
+def split_turns(messages: List[Any]) -> List[List[Any]]:
+    """The messages grouped into turns, each starting at a message from the user."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
 
 
 class Sidekick:
+    # The tools, LLM clients, checkpointer and compiled graph hold no per-session state, so one shared
+    # instance builds them once and every session reuses them; a session has only its own thread id
+    # and, when it browses, its own context in the shared browser
+    shared: Optional["Sidekick"] = None
+    shared_lock = asyncio.Lock()
+
     def __init__(self):
         self.worker_llm_with_tools = None
         self.evaluator_llm_with_output = None
@@ -59,15 +140,31 @@ class Sidekick:
         self.sidekick_id = str(uuid.uuid4())
         self.memory_ctx = None
         self.memory = None
-        self.browser = None
-        self.playwright = None
+        self.loop = None
+        self.active_run = None
 
     async def setup(self):
-        if self.memory is None:
-            self.memory_ctx = AsyncSqliteSaver.from_conn_string("sidekick_memory.db")
-            self.memory = await self.memory_ctx.__aenter__()
-
-        self.tools, self.browser, self.playwright = await playwright_tools()
+        shared = await self.get_shared()
+        self.memory = shared.memory
+        self.tools = shared.tools
+        self.graph = shared.graph
+        self.loop = asyncio.get_running_loop()
+
+    @classmethod
+    async def get_shared(cls) -> "Sidekick":
+        async with cls.shared_lock:
+            if cls.shared is None:
+                shared = cls()
+                await shared.build()
+                cls.shared = shared
+            return cls.shared
+
+    async def build(self):
+        self.memory_ctx = PrunedSqliteSaver.from_conn_string(MEMORY_DB)
+        self.memory = await self.memory_ctx.__aenter__()
+        self.memory.start_maintenance()
+
+        self.tools = await playwright_tools()
         self.tools += await other_tools()
         worker_llm = ChatOpenAI(model="gpt-4o-mini")
         self.worker_llm_with_tools = worker_llm.bind_tools(self.tools)
@@ -78,10 +175,45 @@ class Sidekick:
             EvaluatorOutput
         )
         self.engagement_llm = ChatOpenAI(model="gpt-4o-mini")
+        self.summary_llm = ChatOpenAI(model="gpt-4o-mini")
         self.planner_llm_evaluator = planner_llm.with_structured_output(EvaluatorOutput)
         await self.build_graph()
 
-    def worker(self, state: State) -> Dict[str, Any]:
+    def with_summary(self, system_message: str, state: State) -> str:
+        if state.get("summary"):
+            system_message += f"""
+    Summary of the earlier conversation with the user:
+    {state["summary"]}"""
+        return system_message
+
+    async def context(self, state: State) -> Dict[str, Any]:
+        """
+        Runs at the start of each turn: drops the chatter left from earlier turns and folds the turns
+        before the last CONTEXT_TURNS into the summary, removing them from the checkpointed state.
+        """
+        *earlier, _ = split_turns(state["messages"])
+        cut = max(len(earlier) - CONTEXT_TURNS, 0)
+        old = [message for turn in earlier[:cut] for message in turn]
+        chatter = [message for turn in earlier[cut:] for message in turn if is_chatter(message)]
+        if not old and not chatter:
+            return {}
+        update = {"messages": [RemoveMessage(id=message.id) for message in old + chatter]}
+        folded = [message for message in old if is_conversation(message) and not is_chatter(message)]
+        if folded:
+            system_message = """You keep a running summary of a conversation between a User and an Assistant.
+    Update the summary with the new messages. Keep the user's goals, preferences and decisions, facts and results found so far,
+    and anything left open. Be concise, and reply with only the updated summary."""
+            user_message = f"""The summary so far:
+    {state.get("summary") or "(none)"}
+
+    {self.format_conversation(fit_to_budget(folded, TOKEN_BUDGETS["summary"]))}"""
+            response = await self.summary_llm.ainvoke(
+                [SystemMessage(content=system_message), HumanMessage(content=user_message)]
+            )
+            update["summary"] = response.content
+        return update
+
+    async def worker(self, state: State) -> Dict[str, Any]:
         system_message = f"""You are a helpful assistant that can use tools to complete tasks.
     You keep working on a task until either you have a question or clarification for the user, or the success criteria is met.
     You have many tools to help you, including tools to browse the internet, navigating and retrieving web pages.
@@ -111,20 +243,14 @@ class Sidekick:
     {state["feedback_on_work"]}
     With this feedback, please continue the assignment, ensuring that you meet the success criteria or have a question for the user."""
 
-        # Add in the system message
-
-        found_system_message = False
-        messages = state["messages"]
-        for message in messages:
-            if isinstance(message, SystemMessage):
-                message.content = system_message
-                found_system_message = True
-
-        if not found_system_message:
-            messages = [SystemMessage(content=system_message)] + messages
+        # The plan and the evaluator's feedback are already in the system message
+        system_message = self.with_summary(system_message, state)
+        budget = TOKEN_BUDGETS["worker"] - count_tokens(SystemMessage(content=system_message))
+        visible = [message for message in state["messages"] if not is_chatter(message)]
+        messages = [SystemMessage(content=system_message)] + fit_turn_to_budget(visible, budget)
 
         # Invoke the LLM with tools
-        response = self.worker_llm_with_tools.invoke(messages)
+        response = await self.worker_llm_with_tools.ainvoke(messages)
 
         # Return updated state
         current_response = (
@@ -137,25 +263,19 @@ class Sidekick:
             "final_worker_response": current_response,
         }
 
-    def planner(self, state: State) -> State:
+    async def planner(self, state: State) -> State:
         system_message = f"""You are a planner that determines the next action to take based on the user's request.
         You have a list of tools to help you, including tools to browse the internet, navigating and retrieving web pages.
         You have a tool to run python code, but note that you would need to include a print() statement if you wanted to receive output.
         The current date and time is {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
         Use the full conversation context to keep continuity and avoid repeating already completed work.
         """
+        system_message = self.with_summary(system_message, state)
+        budget = TOKEN_BUDGETS["planner"] - count_tokens(SystemMessage(content=system_message))
+        visible = [message for message in state["messages"] if not is_chatter(message)]
+        messages = [SystemMessage(content=system_message)] + fit_turn_to_budget(visible, budget)
 
-        found_system_message = False
-        messages = state["messages"]
-        for message in messages:
-            if isinstance(message, SystemMessage):
-                message.content = system_message
-                found_system_message = True
-
-        if not found_system_message:
-            messages = [SystemMessage(content=system_message)] + messages
-
-        response = self.planner_llm.invoke(messages)
+        response = await self.planner_llm.ainvoke(messages)
         plan = PlanOutput(
             list_of_steps=response.list_of_steps,
             estimated_complexity=response.estimated_complexity,
@@ -195,17 +315,21 @@ class Sidekick:
                 conversation += f"Assistant: {text}\n"
         return conversation
 
-    def evaluator(self, state: State) -> State:
+    async def evaluator(self, state: State) -> State:
         last_response = state["messages"][-1].content
 
         system_message = """You are an evaluator that determines if a task has been completed successfully by an Assistant.
     Assess the Assistant's last response based on the given criteria. Respond with your feedback, and with your decision on whether the success criteria has been met,
     and whether more input is needed from the user."""
+        visible = [message for message in state["messages"] if is_conversation(message) and not is_chatter(message)]
+        conversation = self.format_conversation(fit_turn_to_budget(visible, TOKEN_BUDGETS["evaluator"]))
+        if state.get("summary"):
+            conversation = f"Summary of the earlier conversation:\n{state['summary']}\n\n{conversation}"
 
         user_message = f"""You are evaluating a conversation between the User and Assistant. You decide what action to take based on the last response from the Assistant.
 
-    The entire conversation with the assistant, with the user's original request and all replies, is:
-    {self.format_conversation(state["messages"])}
+    The conversation with the assistant, with the user's original request and the replies since, is:
+    {conversation}
 
     The success criteria for this assignment is:
     {state["success_criteria"]}
@@ -229,7 +353,7 @@ class Sidekick:
             HumanMessage(content=user_message),
         ]
 
-        eval_result = self.evaluator_llm_with_output.invoke(evaluator_messages)
+        eval_result = await self.evaluator_llm_with_output.ainvoke(evaluator_messages)
         new_state = {
             "messages": [
                 {
@@ -243,7 +367,7 @@ class Sidekick:
         }
         return new_state
 
-    def planner_evaluator(self, state: State) -> State:
+    async def planner_evaluator(self, state: State) -> State:
         user_request = next(
             (
                 msg.content
@@ -272,7 +396,7 @@ class Sidekick:
             HumanMessage(content=user_message),
         ]
 
-        planner_result = self.planner_llm_evaluator.invoke(planner_messages)
+        planner_result = await self.planner_llm_evaluator.ainvoke(planner_messages)
         return {
             "messages": [
                 {
@@ -302,7 +426,7 @@ class Sidekick:
         else:
             return "planner"
 
-    def engagement_agent(self, state: State) -> Dict[str, Any]:
+    async def engagement_agent(self, state: State) -> Dict[str, Any]:
         system_message = """You are an engagement assistant.
 
                             Your task:
@@ -337,9 +461,7 @@ class Sidekick:
                 for msg in reversed(state["messages"])
                 if isinstance(msg, AIMessage)
                 and msg.content
-                and "Plan generated." not in str(msg.content)
-                and "Evaluator Feedback on this answer:" not in str(msg.content)
-                and "Planner Feedback on this plan:" not in str(msg.content)
+                and not is_chatter(msg)
             ),
             "",
         )
@@ -363,7 +485,7 @@ class Sidekick:
 
             Based on this context, provide your engagement follow-up questions.
         """
-        response = self.engagement_llm.invoke(
+        response = await self.engagement_llm.ainvoke(
             [
                 SystemMessage(content=system_message),
                 HumanMessage(content=user_message),
@@ -401,6 +523,7 @@ class Sidekick:
         graph_builder = StateGraph(State)
 
         # Add nodes
+        graph_builder.add_node("context", self.context)
         graph_builder.add_node("planner", self.planner)
         graph_builder.add_node("planner_evaluator", self.planner_evaluator)
         graph_builder.add_node("worker", self.worker)
@@ -409,7 +532,8 @@ class Sidekick:
         graph_builder.add_node("engagement", self.engagement_agent)
 
         # Add edges
-        graph_builder.add_edge(START, "planner")
+        graph_builder.add_edge(START, "context")
+        graph_builder.add_edge("context", "planner")
         graph_builder.add_conditional_edges(
             "planner",
             self.planner_router,
@@ -434,7 +558,28 @@ class Sidekick:
         # Compile the graph
         self.graph = graph_builder.compile(checkpointer=self.memory)
 
+    def verdict(self, node: str, output: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """A collapsed chat message for the plan or an evaluator's verdict, as each node finishes."""
+        if node == "planner":
+            steps = "\n".join(f"{i}. {step}" for i, step in enumerate(output["plan"].list_of_steps, 1))
+            content = f"{steps}\n\nEstimated complexity: {output['plan'].estimated_complexity}"
+            return {"role": "assistant", "content": content, "metadata": {"title": "Plan", "status": "done"}}
+        if node in ("planner_evaluator", "evaluator"):
+            subject = "Plan" if node == "planner_evaluator" else "Answer"
+            if output["user_input_needed"]:
+                title = f"{subject} needs your input"
+            elif output["success_criteria_met"]:
+                title = f"{subject} approved"
+            else:
+                title = f"{subject} rejected, trying again"
+            return {"role": "assistant", "content": output["feedback_on_work"], "metadata": {"title": title, "status": "done"}}
+        return None
+
     async def run_superstep(self, message, success_criteria, history):
+        """
+        Yields the chat as it changes: the plan and each verdict as they are made, the tools as they
+        run, and the worker's answer token by token, ending with the final answer.
+        """
         config = {"configurable": {"thread_id": self.sidekick_id}}
 
         state = {
@@ -448,8 +593,66 @@ class Sidekick:
             "final_worker_response": None,
             "engagement_questions": None,
         }
-        result = await self.graph.ainvoke(state, config=config)
-
+        user = {"role": "user", "content": message}
+        progress, tools, draft = [], {}, None
+
+        def chat():
+            return history + [user] + progress + ([draft] if draft else [])
+
+        events = asyncio.Queue()
+
+        async def run_graph():
+            async for event in self.graph.astream_events(state, config=config, version="v2"):
+                events.put_nowait(event)
+
+        # The graph runs as its own task so that stop() can cancel it, wherever it is awaiting;
+        # the task inherits the session, which is how the browser tools find this session's context
+        current_session.set(self.sidekick_id)
+        self.active_run = asyncio.create_task(run_graph())
+        self.active_run.add_done_callback(lambda _: events.put_nowait(None))
+        yield chat()
+        try:
+            while (event := await events.get()) is not None:
+                kind, name = event["event"], event["name"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                if kind == "on_chat_model_start" and node == "worker":
+                    draft = None
+                    continue
+                elif kind == "on_chat_model_stream" and node == "worker":
+                    token = event["data"]["chunk"].content
+                    if not token:
+                        continue
+                    draft = {"role": "assistant", "content": (draft["content"] if draft else "") + token}
+                elif kind == "on_tool_start":
+                    tools[event["run_id"]] = len(progress)
+                    detail = str(event["data"].get("input") or "")[:300]
+                    progress.append({"role": "assistant", "content": detail, "metadata": {"title": f"Using {name}", "status": "pending"}})
+                elif kind == "on_tool_end" and event["run_id"] in tools:
+                    progress[tools.pop(event["run_id"])]["metadata"]["status"] = "done"
+                elif kind == "on_chain_end" and name == node and (update := self.verdict(node, event["data"]["output"])):
+                    if node == "evaluator" and draft and not event["data"]["output"]["success_criteria_met"]:
+                        # Keep the rejected answer, folded away, rather than overwriting it with the next attempt
+                        progress.append(draft | {"metadata": {"title": "Rejected answer", "status": "done"}})
+                        draft = None
+                    progress.append(update)
+                else:
+                    continue
+                yield chat()
+            await self.active_run
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            for update in progress:
+                update["metadata"]["status"] = "done"
+            yield history + [user] + progress + [{"role": "assistant", "content": "Stopped."}]
+            return
+        finally:
+            # Also reached when the UI stops listening, in which case the graph is still running
+            if self.active_run and not self.active_run.done():
+                self.active_run.cancel()
+            self.active_run = None
+
+        result = (await self.graph.aget_state(config)).values
         worker_response = result.get("final_worker_response") or ""
         engagement_response = result.get("engagement_questions") or ""
         combined_response = worker_response
@@ -458,34 +661,32 @@ class Sidekick:
                 f"{worker_response}\n\nFollow-up questions:\n{engagement_response}"
             )
 
-        user = {"role": "user", "content": message}
-        reply = {"role": "assistant", "content": combined_response}
-        feedback = {
-            "role": "assistant",
-            "content": f"Evaluator Feedback on this answer: {result.get('feedback_on_work') or ''}",
-        }
-        return history + [user, reply, feedback]
+        # The evaluator's feedback is already in the chat, in its verdict
+        reply = [{"role": "assistant", "content": combined_response}] if combined_response else []
+        yield history + [user] + progress + reply
+
+    def stop(self) -> bool:
+        """Cancel the run in progress, if there is one."""
+        if self.active_run and not self.active_run.done():
+            self.active_run.cancel()
+            return True
+        return False
+
+    async def close(self):
+        """
+        Stop any run, give back this session's browser context and delete its checkpoints, since a
+        new session never resumes this thread; the shared resources stay up.
+        """
+        run = self.active_run
+        self.stop()
+        if run:
+            # A cancelled run can still write a checkpoint on its way out, so delete the thread after it
+            await asyncio.wait([run])
+        await browser_pool.release(self.sidekick_id)
+        await self.memory.adelete_thread(self.sidekick_id)
 
     def cleanup(self):
-        async def _cleanup_async():
-            if self.browser:
-                await self.browser.close()
-            if self.playwright:
-                await self.playwright.stop()
-            if self.memory_ctx:
-                await self.memory_ctx.__aexit__(None, None, None)
-                self.memory_ctx = None
-                self.memory = None
-
-        if self.browser:
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(_cleanup_async())
-            except RuntimeError:
-                asyncio.run(_cleanup_async())
-        elif self.memory_ctx:
-            try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(_cleanup_async())
-            except RuntimeError:
-                asyncio.run(_cleanup_async())
+        """close() for callers outside the app's event loop, which owns the run, the context and the database."""
+        if self.loop and not self.loop.is_closed():
+            # Gradio calls this from another thread, and cancelling a task is only safe on its own loop
+            return asyncio.run_coroutine_threadsafe(self.close(), self.loop)
@@ -0,0 +1,207 @@
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from dotenv import load_dotenv
+from datetime import datetime
+import argparse
+import asyncio
+import os
+import time
+import zlib
+
+load_dotenv(override=True)
+
+# Only the latest KEEP_CHECKPOINTS checkpoints of each thread are kept, which is all a run resumes
+# from; threads with no new checkpoint for THREAD_TTL_HOURS are deleted. Every MAINTENANCE_SECONDS
+# the expired threads are removed, the WAL is folded back into the database and, once enough of
+# the file is free pages, it is vacuumed.
+
+MEMORY_DB = os.getenv("SIDEKICK_MEMORY_DB", "sidekick_memory.db")
+KEEP_CHECKPOINTS = int(os.getenv("SIDEKICK_KEEP_CHECKPOINTS", "20"))
+THREAD_TTL_HOURS = float(os.getenv("SIDEKICK_THREAD_TTL_HOURS", "72"))
+MAINTENANCE_SECONDS = float(os.getenv("SIDEKICK_MAINTENANCE_SECONDS", "3600"))
+VACUUM_FREE_FRACTION = 0.25
+COMPRESS_MIN_BYTES = 256
+
+
+class CompressedSerializer:
+    """
+    The default serializer with large blobs zlib-compressed, marked by a "zlib+" prefix on their type
+    so that rows written before compression still load.
+    """
+
+    def __init__(self, serde=None):
+        self.serde = serde or JsonPlusSerializer()
+
+    def dumps_typed(self, obj) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return f"zlib+{type_}", zlib.compress(data)
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]):
+        type_, blob = data
+        if type_.startswith("zlib+"):
+            return self.serde.loads_typed((type_.removeprefix("zlib+"), zlib.decompress(blob)))
+        return self.serde.loads_typed(data)
+
+
+class PrunedSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver that compresses its blobs, keeps a bounded history per thread and expires idle threads."""
+
+    def __init__(self, conn, *, serde=None, keep_checkpoints: int = KEEP_CHECKPOINTS, ttl_hours: float = THREAD_TTL_HOURS):
+        super().__init__(conn, serde=serde or CompressedSerializer())
+        self.keep_checkpoints = keep_checkpoints
+        self.ttl_hours = ttl_hours
+        self.maintainer = None
+        self.activity_ready = False
+
+    async def setup(self) -> None:
+        await super().setup()
+        if self.activity_ready:
+            return
+        async with self.lock:
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+            )
+            # Threads from before this table start their TTL now
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO thread_activity (thread_id, last_used) SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (time.time(),),
+            )
+            await self.conn.commit()
+            self.activity_ready = True
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_used = excluded.last_used",
+                (thread_id, time.time()),
+            )
+            # The oldest checkpoint id to keep; anything before it, and its writes, goes
+            await cur.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.keep_checkpoints - 1),
+            )
+            row = await cur.fetchone()
+            if row:
+                for table in ("checkpoints", "writes"):
+                    await cur.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, row[0]),
+                    )
+            await self.conn.commit()
+        return result
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        # A session can be closed before anything was checkpointed, when the tables may not exist yet
+        await self.setup()
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
+
+    async def expire_threads(self) -> int:
+        """Delete the threads idle for longer than the TTL; returns how many were deleted."""
+        await self.setup()
+        cutoff = time.time() - self.ttl_hours * 3600
+        # The connection is shared with running graphs, so it is only used under the lock;
+        # adelete_thread takes the lock itself, so the threads are deleted once it is released
+        async with self.lock, self.conn.execute("SELECT thread_id FROM thread_activity WHERE last_used < ?", (cutoff,)) as cur:
+            expired = [row[0] for row in await cur.fetchall()]
+        for thread_id in expired:
+            await self.adelete_thread(thread_id)
+        return len(expired)
+
+    async def compact(self, force_vacuum: bool = False) -> dict:
+        """Fold the WAL back into the database, and vacuum if enough of the file is free pages."""
+        await self.setup()
+        async with self.lock:
+            async with self.conn.execute("PRAGMA page_count") as cur:
+                pages = (await cur.fetchone())[0]
+            async with self.conn.execute("PRAGMA freelist_count") as cur:
+                free = (await cur.fetchone())[0]
+            vacuumed = force_vacuum or (pages and free / pages >= VACUUM_FREE_FRACTION)
+            if vacuumed:
+                await self.conn.execute("VACUUM")
+            await self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"pages": pages, "free_pages": free, "vacuumed": bool(vacuumed)}
+
+    async def maintain(self) -> dict:
+        expired = await self.expire_threads()
+        return {"expired_threads": expired} | await self.compact()
+
+    async def maintain_forever(self, interval: float = MAINTENANCE_SECONDS) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                print(f"Error maintaining checkpoint store: {e}")
+            await asyncio.sleep(interval)
+
+    def start_maintenance(self) -> None:
+        if self.maintainer is None or self.maintainer.done():
+            self.maintainer = asyncio.create_task(self.maintain_forever())
+
+    async def storage_report(self) -> list[dict]:
+        """Checkpoints, writes and stored bytes per thread, largest first."""
+        await self.setup()
+        query = """
+            SELECT t.thread_id, COALESCE(c.checkpoints, 0), COALESCE(c.bytes, 0), COALESCE(w.writes, 0),
+                   COALESCE(w.bytes, 0), a.last_used
+            FROM (SELECT thread_id FROM checkpoints UNION SELECT thread_id FROM writes) t
+            LEFT JOIN (SELECT thread_id, COUNT(*) AS checkpoints,
+                              SUM(LENGTH(checkpoint) + LENGTH(metadata)) AS bytes
+                       FROM checkpoints GROUP BY thread_id) c ON c.thread_id = t.thread_id
+            LEFT JOIN (SELECT thread_id, COUNT(*) AS writes, SUM(LENGTH(value)) AS bytes
+                       FROM writes GROUP BY thread_id) w ON w.thread_id = t.thread_id
+            LEFT JOIN thread_activity a ON a.thread_id = t.thread_id
+        """
+        async with self.lock, self.conn.execute(query) as cur:
+            rows = await cur.fetchall()
+        report = [
+            {
+                "thread_id": thread_id,
+                "checkpoints": checkpoints,
+                "writes": writes,
+                "bytes": checkpoint_bytes + write_bytes,
+                "last_used": datetime.fromtimestamp(last_used).strftime("%Y-%m-%d %H:%M:%S") if last_used else "",
+            }
+            for thread_id, checkpoints, checkpoint_bytes, writes, write_bytes, last_used in rows
+        ]
+        return sorted(report, key=lambda row: row["bytes"], reverse=True)
+
+
+def format_report(report: list[dict], db_path: str) -> str:
+    lines = [f"{'thread':38} {'checkpoints':>11} {'writes':>7} {'KiB':>9}  last used"]
+    for row in report:
+        lines.append(
+            f"{row['thread_id']:38} {row['checkpoints']:>11} {row['writes']:>7} {row['bytes'] / 1024:>9.1f}  {row['last_used']}"
+        )
+    files = sum(os.path.getsize(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path))
+    stored = sum(row["bytes"] for row in report)
+    lines.append(f"{len(report)} threads, {stored / 1024:.1f} KiB of blobs, {files / 1024:.1f} KiB on disk with the WAL")
+    return "\n".join(lines)
+
+
+async def main(db_path: str, maintain: bool, vacuum: bool) -> None:
+    async with PrunedSqliteSaver.from_conn_string(db_path) as saver:
+        if maintain or vacuum:
+            expired = await saver.expire_threads()
+            print(f"Expired {expired} threads; compaction: {await saver.compact(force_vacuum=vacuum)}")
+        print(format_report(await saver.storage_report(), db_path))
+
+
+# Usage: uv run sidekick_memory.py [--db sidekick_memory.db] [--maintain] [--vacuum]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report, prune and compact the Sidekick checkpoint store")
+    parser.add_argument("--db", default=MEMORY_DB)
+    parser.add_argument("--maintain", action="store_true", help="Expire idle threads and compact before reporting")
+    parser.add_argument("--vacuum", action="store_true", help="Like --maintain, and always vacuum")
+    args = parser.parse_args()
+    asyncio.run(main(args.db, args.maintain, args.vacuum))
@@ -1,7 +1,10 @@
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, Browser, BrowserContext
 from langchain_community.agent_toolkits import PlayWrightBrowserToolkit
 from dotenv import load_dotenv
+from contextvars import ContextVar
+import asyncio
 import os
+import time
 import requests
 from langchain.agents import Tool
 from langchain_community.agent_toolkits import FileManagementToolkit
@@ -18,11 +21,112 @@ pushover_user = os.getenv("PUSHOVER_USER")
 pushover_url = "https://api.pushover.net/1/messages.json"
 serper = GoogleSerperAPIWrapper()
 
+# Every session shares one headless Chromium, each in its own BrowserContext (separate pages, cookies
+# and storage). Contexts idle for longer than the timeout are closed, and when the cap is reached the
+# least recently used one is closed to make room; its session gets a fresh context on its next browse.
+
+HEADLESS = os.getenv("SIDEKICK_HEADLESS", "true").strip().lower() == "true"
+MAX_BROWSER_CONTEXTS = int(os.getenv("SIDEKICK_MAX_BROWSER_CONTEXTS", "20"))
+CONTEXT_IDLE_SECONDS = float(os.getenv("SIDEKICK_CONTEXT_IDLE_SECONDS", "900"))
+REAP_INTERVAL_SECONDS = 60
+
+# The session whose graph run is in progress; tasks started by the run inherit it
+current_session: ContextVar[str | None] = ContextVar("current_session", default=None)
+
+
+class BrowserPool:
+    def __init__(self, max_contexts: int = MAX_BROWSER_CONTEXTS, idle_seconds: float = CONTEXT_IDLE_SECONDS):
+        self.max_contexts = max_contexts
+        self.idle_seconds = idle_seconds
+        self.playwright = None
+        self.browser = None
+        self.contexts: dict[str, BrowserContext] = {}
+        self.last_used: dict[str, float] = {}
+        self.lock = asyncio.Lock()
+        self.reaper = None
+
+    async def start(self) -> Browser:
+        async with self.lock:
+            if self.browser is None or not self.browser.is_connected():
+                if self.playwright is None:
+                    self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(headless=HEADLESS)
+                self.contexts.clear()
+                self.last_used.clear()
+            if self.reaper is None or self.reaper.done():
+                self.reaper = asyncio.create_task(self.reap_forever())
+            return self.browser
+
+    def get(self, session_id: str) -> BrowserContext | None:
+        context = self.contexts.get(session_id)
+        if context is not None:
+            self.last_used[session_id] = time.monotonic()
+        return context
+
+    async def lease(self, session_id: str) -> BrowserContext:
+        """The session's context, created on first use."""
+        browser = await self.start()
+        async with self.lock:
+            if session_id not in self.contexts:
+                while len(self.contexts) >= self.max_contexts:
+                    await self.close_context(min(self.last_used, key=self.last_used.get))
+                self.contexts[session_id] = await browser.new_context()
+            self.last_used[session_id] = time.monotonic()
+            return self.contexts[session_id]
+
+    async def close_context(self, session_id: str) -> None:
+        context = self.contexts.pop(session_id, None)
+        self.last_used.pop(session_id, None)
+        if context is not None:
+            try:
+                await context.close()
+            except Exception as e:
+                print(f"Error closing browser context: {e}")
+
+    async def release(self, session_id: str) -> None:
+        async with self.lock:
+            await self.close_context(session_id)
+
+    async def reap(self) -> int:
+        """Close the contexts that have been idle for too long; returns how many were closed."""
+        async with self.lock:
+            cutoff = time.monotonic() - self.idle_seconds
+            idle = [session_id for session_id, used in self.last_used.items() if used < cutoff]
+            for session_id in idle:
+                await self.close_context(session_id)
+            return len(idle)
+
+    async def reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL_SECONDS)
+            await self.reap()
+
+
+browser_pool = BrowserPool()
+
+
+class SessionBrowser(Browser):
+    """
+    Stands in for the browser in the shared Playwright tools. They only ask a browser for its contexts,
+    or for a new one when there are none, so each session is shown just the context leased to it.
+    """
+
+    def __init__(self, pool: BrowserPool):
+        self.pool = pool
+
+    @property
+    def contexts(self) -> list[BrowserContext]:
+        context = self.pool.get(current_session.get())
+        return [context] if context is not None else []
+
+    async def new_context(self, **kwargs) -> BrowserContext:
+        return await self.pool.lease(current_session.get())
+
+
 async def playwright_tools():
-    playwright = await async_playwright().start()
-    browser = await playwright.chromium.launch(headless=False)
-    toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=browser)
-    return toolkit.get_tools(), browser, playwright
+    await browser_pool.start()
+    toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=SessionBrowser(browser_pool))
+    return toolkit.get_tools()
 
 
 def push(text: str):
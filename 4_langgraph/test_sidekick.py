@@ -0,0 +1,195 @@
+"""
+Checks that Sidekick's graph runs its sessions concurrently, that Stop cancels a run in flight, that
+cleaning up a session from another thread stops its run before deleting its checkpoints, and that
+cutting a prompt to its token budget keeps the user's request.
+The LLMs are replaced by stand-ins that wait a fixed time and give a canned reply, and checkpoints
+are kept in memory, so no model API, browser or database is used.
+
+Usage: uv run pytest test_sidekick.py  (or: uv run test_sidekick.py)
+"""
+
+import asyncio
+import threading
+import time
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+import sidekick as sidekick_module
+from sidekick import Sidekick, PlanOutput, EvaluatorOutput, fit_turn_to_budget, is_conversation
+
+DELAY = 0.2
+SESSIONS = 10
+
+
+class SlowModel:
+    """Answers ainvoke with make() after DELAY seconds, like a model call that doesn't block the loop."""
+
+    def __init__(self, make):
+        self.make = make
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(DELAY)
+        return self.make()
+
+
+@tool
+def echo(text: str) -> str:
+    """Return the text unchanged."""
+    return text
+
+
+async def shared_sidekick() -> Sidekick:
+    """Build what Sidekick.build() would, with stand-in models; sessions then share it as setup() does."""
+    shared = Sidekick()
+    shared.memory = InMemorySaver()
+    shared.tools = [echo]
+    approve = lambda: EvaluatorOutput(feedback="Looks good", success_criteria_met=True, user_input_needed=False)
+    shared.planner_llm = SlowModel(lambda: PlanOutput(list_of_steps=["Answer"], estimated_complexity="low"))
+    shared.planner_llm_evaluator = SlowModel(approve)
+    shared.worker_llm_with_tools = SlowModel(lambda: AIMessage(content="The answer"))
+    shared.evaluator_llm_with_output = SlowModel(approve)
+    shared.engagement_llm = SlowModel(lambda: AIMessage(content="NO_QUESTIONS"))
+    shared.summary_llm = SlowModel(lambda: AIMessage(content="Summary"))
+    await shared.build_graph()
+    return shared
+
+
+def session(shared: Sidekick) -> Sidekick:
+    sidekick = Sidekick()
+    sidekick.memory, sidekick.tools, sidekick.graph = shared.memory, shared.tools, shared.graph
+    sidekick.loop = asyncio.get_running_loop()
+    return sidekick
+
+
+async def last_chat(sidekick: Sidekick, message: str) -> list[dict]:
+    chat = None
+    async for chat in sidekick.run_superstep(message, "", []):
+        pass
+    return chat
+
+
+def test_concurrent_sessions_take_about_as_long_as_one():
+    async def run():
+        shared = await shared_sidekick()
+        start = time.perf_counter()
+        assert (await last_chat(session(shared), "Hi"))[-1]["content"] == "The answer"
+        one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chats = await asyncio.gather(*(last_chat(session(shared), "Hi") for _ in range(SESSIONS)))
+        many = time.perf_counter() - start
+        assert all(chat[-1]["content"] == "The answer" for chat in chats)
+        # Run one after another they would take SESSIONS times as long
+        assert many < 2 * one, f"{SESSIONS} sessions took {many:.2f}s, one took {one:.2f}s"
+
+    asyncio.run(run())
+
+
+def test_stop_cancels_the_run_in_flight():
+    async def run():
+        sidekick = session(await shared_sidekick())
+        run = asyncio.create_task(last_chat(sidekick, "Hi"))
+        # Part way through the second model call
+        await asyncio.sleep(DELAY * 1.5)
+        stopped = time.perf_counter()
+        assert sidekick.stop()
+        chat = await run
+        assert time.perf_counter() - stopped < DELAY / 2, "stop() waited for the model call to finish"
+        assert chat[-1]["content"] == "Stopped."
+        assert sidekick.active_run is None
+        assert not sidekick.stop()
+
+        # The session carries on with its next message
+        assert (await last_chat(sidekick, "Hi again"))[-1]["content"] == "The answer"
+
+    asyncio.run(run())
+
+
+def test_cancelling_the_caller_cancels_the_graph():
+    async def run():
+        sidekick = session(await shared_sidekick())
+        run = asyncio.create_task(last_chat(sidekick, "Hi"))
+        await asyncio.sleep(DELAY * 1.5)
+        graph = sidekick.active_run
+        run.cancel()
+        try:
+            await run
+            raise AssertionError("the run should have been cancelled")
+        except asyncio.CancelledError:
+            pass
+        await asyncio.wait([graph], timeout=1)
+        assert graph.cancelled()
+        assert sidekick.active_run is None
+
+    asyncio.run(run())
+
+
+class FakeBrowserPool:
+    def __init__(self):
+        self.released = []
+
+    async def release(self, session_id: str) -> None:
+        self.released.append(session_id)
+
+
+def test_cleanup_from_another_thread_deletes_the_thread_after_the_run_ends():
+    async def run():
+        shared = await shared_sidekick()
+        sidekick = session(shared)
+        config = {"configurable": {"thread_id": sidekick.sidekick_id}}
+        pool, browser_pool = FakeBrowserPool(), sidekick_module.browser_pool
+        sidekick_module.browser_pool = pool
+        try:
+            run = asyncio.create_task(last_chat(sidekick, "Hi"))
+            await asyncio.sleep(DELAY * 1.5)
+            graph = sidekick.active_run
+            assert await shared.memory.aget_tuple(config) is not None
+
+            # As Gradio does when the browser tab goes away
+            done = []
+            thread = threading.Thread(target=lambda: done.append(sidekick.cleanup()))
+            thread.start()
+            await asyncio.to_thread(thread.join)
+            await asyncio.wrap_future(done[0])
+            assert graph.cancelled()
+            assert (await run)[-1]["content"] == "Stopped."
+            assert pool.released == [sidekick.sidekick_id]
+            assert await shared.memory.aget_tuple(config) is None
+        finally:
+            sidekick_module.browser_pool = browser_pool
+
+    asyncio.run(run())
+
+
+def test_budget_keeps_the_users_request_through_long_tool_results():
+    call = AIMessage(content="", tool_calls=[{"name": "echo", "args": {"text": "page"}, "id": "1"}])
+    messages = [
+        HumanMessage(content="An earlier question"),
+        AIMessage(content="An earlier answer"),
+        HumanMessage(content="Summarise these pages"),
+        call,
+        ToolMessage(content="page " * 400, tool_call_id="1"),
+        call,
+        ToolMessage(content="page " * 400, tool_call_id="1"),
+        AIMessage(content="The summary"),
+    ]
+    # The tool results alone are over the budget, which fit_to_budget would fill from the end
+    fitted = fit_turn_to_budget(messages, 600)
+    assert fitted[0].content == "Summarise these pages"
+    assert fitted[-1].content == "The summary"
+    assert not isinstance(fitted[1], ToolMessage)
+
+    # Once the tool results are left out, as format_conversation does, the earlier turn fits too
+    fitted = fit_turn_to_budget([message for message in messages if is_conversation(message)], 600)
+    assert [message.content for message in fitted if message.content][:3] == [
+        "An earlier question",
+        "An earlier answer",
+        "Summarise these pages",
+    ]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,69 @@
+"""
+Checks that the checkpoint store's maintenance only uses the shared connection under the saver's
+lock, as the running graphs do, that expiring threads doesn't deadlock on that lock, and that a
+thread can be deleted before anything was checkpointed.
+
+Usage: uv run pytest test_sidekick_memory.py  (or: uv run test_sidekick_memory.py)
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from sidekick_memory import PrunedSqliteSaver
+
+
+def test_maintenance_queries_hold_the_lock():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            async with PrunedSqliteSaver.from_conn_string(os.path.join(directory, "memory.db")) as saver:
+                await saver.setup()
+                execute, unlocked = saver.conn.execute, []
+
+                def checked_execute(sql, *args):
+                    if not saver.lock.locked():
+                        unlocked.append(sql.split()[0])
+                    return execute(sql, *args)
+
+                saver.conn.execute = checked_execute
+                await saver.storage_report()
+                await saver.expire_threads()
+                assert not unlocked, f"ran {unlocked} without the lock"
+
+    asyncio.run(run())
+
+
+def test_expire_threads_deletes_only_idle_threads():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            async with PrunedSqliteSaver.from_conn_string(os.path.join(directory, "memory.db")) as saver:
+                await saver.setup()
+                now = time.time()
+                async with saver.lock:
+                    await saver.conn.executemany(
+                        "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?)",
+                        [("idle", now - (saver.ttl_hours + 1) * 3600), ("recent", now)],
+                    )
+                    await saver.conn.commit()
+                # Deleting takes the lock too, so this would hang if the lock were held throughout
+                assert await asyncio.wait_for(saver.expire_threads(), 5) == 1
+                async with saver.lock, saver.conn.execute("SELECT thread_id FROM thread_activity") as cur:
+                    assert [row[0] for row in await cur.fetchall()] == ["recent"]
+
+    asyncio.run(run())
+
+
+def test_deleting_a_thread_before_any_checkpoint():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            async with PrunedSqliteSaver.from_conn_string(os.path.join(directory, "memory.db")) as saver:
+                await asyncio.wait_for(saver.adelete_thread("never used"), 5)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,121 @@
+import asyncio
+from collections import defaultdict
+from typing import Callable, TypeVar
+from accounts import Account
+from database import read_account_version, savepoint, transaction
+from market import get_share_prices
+
+T = TypeVar("T")
+
+
+class AccountService:
+    """
+    The write path for accounts, shared by every tool call in a process.
+
+    Accounts are kept in memory and reused for as long as their database version is unchanged, so
+    a read costs one indexed lookup instead of reloading the holdings. Mutations of an account are
+    queued and applied by that account's committer task, which belongs to no caller, so a caller
+    being cancelled doesn't strand the others: everything that queued up while the previous commit
+    was in flight is applied in one transaction, each mutation in its own
+    savepoint so that one that fails (insufficient funds, say) doesn't undo the others. The version
+    is checked again once the transaction holds the write lock, so a change committed by another
+    process is loaded before anything is applied on top of it.
+    """
+
+    def __init__(self):
+        self.accounts: dict[str, Account] = {}
+        self.pending: dict[str, list[tuple[Callable[[Account], object], asyncio.Future, list[str]]]] = defaultdict(list)
+        self.committers: dict[str, asyncio.Task] = {}
+        self.commits = 0
+        self.mutations = 0
+
+    def get(self, name: str) -> Account:
+        """The account as last committed, from memory if no one has changed it since it was loaded."""
+        name = name.lower()
+        if self.committing(name):
+            # The cached copy is being changed by a commit in flight, so read what is committed instead
+            return Account.get(name)
+        return self.cached(name)
+
+    def cached(self, name: str) -> Account:
+        account = self.accounts.get(name)
+        if account is None or account._version != read_account_version(name):
+            account = self.accounts[name] = Account.get(name)
+        return account
+
+    def committing(self, name: str) -> bool:
+        committer = self.committers.get(name)
+        return committer is not None and not committer.done()
+
+    async def mutate(self, name: str, change: Callable[[Account], T], symbols: list[str] = ()) -> T:
+        """
+        Apply change to the account and return its result once committed. Pass the symbols it will
+        price so they can be looked up before the write lock is taken. If the caller is cancelled
+        the change may still be committed, along with the rest of its group.
+        """
+        name = name.lower()
+        future = asyncio.get_running_loop().create_future()
+        self.pending[name].append((change, future, list(symbols)))
+        if not self.committing(name):
+            self.committers[name] = asyncio.create_task(self.commit_pending(name))
+        return await future
+
+    async def commit_pending(self, name: str) -> None:
+        while self.pending[name]:
+            group, self.pending[name] = self.pending[name], []
+            await self.commit(name, group)
+
+    async def commit(self, name: str, group: list) -> None:
+        try:
+            results = await asyncio.to_thread(self.apply, name, group)
+        except Exception as e:
+            self.accounts.pop(name, None)
+            results = [(None, e)] * len(group)
+        except BaseException:
+            # The committer itself was cancelled, so the outcome is unknown; don't leave anyone waiting
+            self.accounts.pop(name, None)
+            for _, future, _ in group + self.pending.pop(name, []):
+                if not future.done():
+                    future.cancel()
+            raise
+        for (_, future, _), (result, error) in zip(group, results):
+            if future.done():
+                # Its caller was cancelled and is no longer waiting
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def apply(self, name: str, group: list) -> list[tuple[object, Exception | None]]:
+        """Run a group of mutations in one transaction, returning each one's result or error."""
+        account = self.cached(name)
+        # Warm the price cache so that no lookup goes out to the network under the write lock
+        get_share_prices(list(account.holdings) + [symbol for _, _, symbols in group for symbol in symbols])
+        results = []
+        with transaction():
+            account = self.cached(name)
+            for change, _, _ in group:
+                try:
+                    with savepoint():
+                        results.append((change(account), None))
+                except Exception as e:
+                    results.append((None, e))
+                    # The failed change may have been partly applied in memory; reload what is committed so far
+                    account = self.accounts[name] = Account.get(name)
+            account._version = read_account_version(name)
+        self.commits += 1
+        self.mutations += len(group)
+        return results
+
+    async def buy_shares(self, name: str, symbol: str, quantity: int, rationale: str) -> str:
+        return await self.mutate(name, lambda account: account.buy_shares(symbol, quantity, rationale), [symbol])
+
+    async def sell_shares(self, name: str, symbol: str, quantity: int, rationale: str) -> str:
+        return await self.mutate(name, lambda account: account.sell_shares(symbol, quantity, rationale), [symbol])
+
+    async def change_strategy(self, name: str, strategy: str) -> str:
+        return await self.mutate(name, lambda account: account.change_strategy(strategy))
+
+
+account_service = AccountService()
@@ -1,15 +1,33 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 import json
+import os
 from dotenv import load_dotenv
-from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+from market import get_share_price, get_share_prices, now
+from database import (
+    write_account,
+    read_account,
+    read_accounts,
+    read_account_version,
+    write_log,
+    transaction,
+    write_holding,
+    write_transaction,
+    read_transactions,
+    read_transactions_page,
+    write_portfolio_snapshot,
+    read_portfolio_history,
+    reset_account,
+)
 
 load_dotenv(override=True)
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
 
+# How many of the latest transactions the account summary includes, and how many a page of history holds
+SUMMARY_TRANSACTIONS = int(os.getenv("ACCOUNT_SUMMARY_TRANSACTIONS", "10"))
+TRANSACTIONS_PAGE_SIZE = int(os.getenv("ACCOUNT_TRANSACTIONS_PAGE_SIZE", "50"))
+
 
 class Transaction(BaseModel):
     symbol: str
@@ -30,8 +48,15 @@ class Account(BaseModel):
     balance: float
     strategy: str
     holdings: dict[str, int]
-    transactions: list[Transaction]
-    portfolio_value_time_series: list[tuple[str, float]]
+    # Running totals kept up to date on every trade, so P&L never needs the full history
+    net_invested: float = 0.0
+    realized_pnl: float = 0.0
+    cost_basis: dict[str, float] = {}
+    # History is loaded from its own tables on first access, and only appended to afterwards
+    _transactions: list[Transaction] | None = PrivateAttr(default=None)
+    _portfolio_value_time_series: list[tuple[str, float]] | None = PrivateAttr(default=None)
+    # The database version this copy was loaded at, so a cached Account can tell when it is stale
+    _version: int | None = PrivateAttr(default=None)
 
     @classmethod
     def get(cls, name: str):
@@ -42,23 +67,79 @@ class Account(BaseModel):
                 "balance": INITIAL_BALANCE,
                 "strategy": "",
                 "holdings": {},
-                "transactions": [],
-                "portfolio_value_time_series": []
             }
-            write_account(name, fields)
-        return cls(**fields)
-    
-    
+            write_account(name, fields["balance"], fields["strategy"])
+            fields["version"] = read_account_version(name)
+        account = cls(**fields)
+        account._version = fields["version"]
+        return account
+
+    @classmethod
+    def get_many(cls, names: list[str]) -> dict[str, "Account"]:
+        """ Load several accounts with one query, keyed by lowercase name; missing ones are created. """
+        accounts = {}
+        for name, fields in read_accounts(names).items():
+            account = accounts[name] = cls(**fields)
+            account._version = fields["version"]
+        for name in names:
+            if name.lower() not in accounts:
+                accounts[name.lower()] = cls.get(name)
+        return accounts
+
+    @property
+    def transactions(self) -> list[Transaction]:
+        if self._transactions is None:
+            self._transactions = [Transaction(**row) for row in read_transactions(self.name)]
+        return self._transactions
+
+    @property
+    def portfolio_value_time_series(self) -> list[tuple[str, float]]:
+        if self._portfolio_value_time_series is None:
+            self._portfolio_value_time_series = read_portfolio_history(self.name)
+        return self._portfolio_value_time_series
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        write_account(self.name.lower(), self.balance, self.strategy, self.net_invested, self.realized_pnl)
+
+    def apply_to_aggregates(self, trade: Transaction):
+        """ Update the running totals for a trade; holdings must already reflect it. """
+        self.net_invested += trade.total()
+        symbol = trade.symbol
+        if trade.quantity > 0:
+            self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) + trade.total()
+        else:
+            held_before = self.holdings.get(symbol, 0) - trade.quantity
+            average_cost = self.cost_basis.get(symbol, 0.0) / held_before
+            self.realized_pnl += (trade.price - average_cost) * -trade.quantity
+            self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) + average_cost * trade.quantity
+        if not self.holdings.get(symbol):
+            self.cost_basis.pop(symbol, None)
+
+    def record_transaction(self, trade: Transaction):
+        """ Append a transaction to the history, and persist it along with the changed holding. """
+        self.apply_to_aggregates(trade)
+        write_transaction(self.name, trade.model_dump())
+        write_holding(self.name, trade.symbol, self.holdings.get(trade.symbol, 0), self.cost_basis.get(trade.symbol, 0.0))
+        if self._transactions is not None:
+            self._transactions.append(trade)
+
+    def record_portfolio_value(self, portfolio_value: float):
+        """ Append a point to the portfolio value time series. """
+        point = (now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value)
+        write_portfolio_snapshot(self.name, *point)
+        if self._portfolio_value_time_series is not None:
+            self._portfolio_value_time_series.append(point)
 
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
         self.strategy = strategy
         self.holdings = {}
-        self.transactions = []
-        self.portfolio_value_time_series = []
-        self.save()
+        self.net_invested = 0.0
+        self.realized_pnl = 0.0
+        self.cost_basis = {}
+        self._transactions = []
+        self._portfolio_value_time_series = []
+        reset_account(self.name, self.balance, self.strategy)
 
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
@@ -89,16 +170,21 @@ class Account(BaseModel):
         
         # Update holdings
         self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
+        trade = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
         
         # Update balance
         self.balance -= total_cost
-        self.save()
-        write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        # Price the portfolio first so no lookup happens while holding the write lock,
+        # then save, append the transaction and snapshot the value in a single commit
+        portfolio_value = self.calculate_portfolio_value()
+        with transaction():
+            self.record_transaction(trade)
+            self.save()
+            self.record_portfolio_value(portfolio_value)
+            write_log(self.name, "account", f"Bought {quantity} of {symbol}")
+        return "Completed. Latest details:\n" + self.summary()
 
     def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Sell shares of a stock if the user has enough shares. """
@@ -115,28 +201,33 @@ class Account(BaseModel):
         # If shares are completely sold, remove from holdings
         if self.holdings[symbol] == 0:
             del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
-        self.transactions.append(transaction)
+        trade = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
 
         # Update balance
         self.balance += total_proceeds
-        self.save()
-        write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        # Price the portfolio first so no lookup happens while holding the write lock,
+        # then save, append the transaction and snapshot the value in a single commit
+        portfolio_value = self.calculate_portfolio_value()
+        with transaction():
+            self.record_transaction(trade)
+            self.save()
+            self.record_portfolio_value(portfolio_value)
+            write_log(self.name, "account", f"Sold {quantity} of {symbol}")
+        return "Completed. Latest details:\n" + self.summary()
 
     def calculate_portfolio_value(self):
         """ Calculate the total value of the user's portfolio. """
+        prices = get_share_prices(list(self.holdings))
         total_value = self.balance
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices.get(symbol, 0.0) * quantity
         return total_value
 
     def calculate_profit_loss(self, portfolio_value: float):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        return portfolio_value - self.net_invested - self.balance
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -144,23 +235,61 @@ class Account(BaseModel):
 
     def get_profit_loss(self):
         """ Report the user's profit or loss at any point in time. """
-        return self.calculate_profit_loss()
+        return self.calculate_profit_loss(self.calculate_portfolio_value())
 
     def list_transactions(self):
         """ List all transactions made by the user. """
         return [transaction.model_dump() for transaction in self.transactions]
     
-    def report(self) -> str:
-        """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
+    def report(self, portfolio_value: float | None = None) -> str:
+        """ Return a json string representing the account. The account is not changed: snapshots of its value are taken by record_portfolio_value. """
+        if portfolio_value is None:
+            portfolio_value = self.calculate_portfolio_value()
         pnl = self.calculate_profit_loss(portfolio_value)
         data = self.model_dump()
+        page = json.loads(self.transactions_page())
+        data["transactions"] = page["transactions"]
+        data["next_transactions"] = page["next"]
+        data["portfolio_value_time_series"] = self.portfolio_value_time_series
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
         write_log(self.name, "account", f"Retrieved account details")
         return json.dumps(data)
+
+    def summary(self, last_n: int = SUMMARY_TRANSACTIONS) -> str:
+        """ Return a compact json summary of the account: cash, priced holdings, P&L and the latest transactions. Nothing is written. """
+        prices = get_share_prices(list(self.holdings))
+        holdings = {
+            symbol: {
+                "quantity": quantity,
+                "price": prices.get(symbol, 0.0),
+                "value": prices.get(symbol, 0.0) * quantity,
+                "cost_basis": self.cost_basis.get(symbol, 0.0),
+            }
+            for symbol, quantity in self.holdings.items()
+        }
+        portfolio_value = self.balance + sum(holding["value"] for holding in holdings.values())
+        recent = read_transactions_page(self.name, last_n)
+        for row in recent:
+            del row["id"]
+        return json.dumps({
+            "name": self.name,
+            "balance": self.balance,
+            "holdings": holdings,
+            "total_portfolio_value": portfolio_value,
+            "total_profit_loss": self.calculate_profit_loss(portfolio_value),
+            "realized_profit_loss": self.realized_pnl,
+            "recent_transactions": recent[::-1],
+        })
+
+    def transactions_page(self, before_id: int | None = None, limit: int = TRANSACTIONS_PAGE_SIZE) -> str:
+        """ Return a json page of transactions, newest first, and the id to pass as before_id for the next page (null on the last). """
+        rows = read_transactions_page(self.name, limit + 1, before_id)
+        next_id = rows[limit - 1]["id"] if len(rows) > limit else None
+        transactions = rows[:limit]
+        for row in transactions:
+            del row["id"]
+        return json.dumps({"transactions": transactions, "next": next_id})
     
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
@@ -1,39 +1,204 @@
 import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 from agents import FunctionTool
+import anyio
+import asyncio
 import json
+import os
 
 params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
 
+# How long an unused session is kept open before its server process is shut down
+IDLE_TIMEOUT_SECONDS = float(os.getenv("MCP_SESSION_IDLE_TIMEOUT_SECONDS", "600"))
+
+# Tools that change an account, so must not be sent twice
+MUTATING_TOOLS = {"buy_shares", "sell_shares", "change_strategy"}
+
+
+def connection_lost(e: Exception) -> bool:
+    return never_sent(e) or (isinstance(e, McpError) and e.error.code == CONNECTION_CLOSED)
+
+
+def never_sent(e: Exception) -> bool:
+    """The request failed writing to a closed stream, so the server never saw it."""
+    return isinstance(e, (anyio.ClosedResourceError, anyio.BrokenResourceError))
+
+
+class WatchedSession(mcp.ClientSession):
+    """A ClientSession that sets lost once its read stream closes, i.e. the server has gone away."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lost = asyncio.Event()
+
+    async def _receive_loop(self) -> None:
+        try:
+            await super()._receive_loop()
+        finally:
+            self.lost.set()
+
+
+class MCPSessionManager:
+    """
+    Keeps one long-lived stdio session to an MCP server, shared by every caller on the event loop.
+    The session is started on first use and reference-counted; once nobody holds it for
+    idle_timeout seconds the server is shut down. If the server dies, the session is dropped and the
+    next call reconnects. Calls are pipelined over the one session, which matches responses to
+    requests by id.
+    """
+
+    def __init__(self, params: StdioServerParameters, idle_timeout: float = IDLE_TIMEOUT_SECONDS):
+        self.params = params
+        self.idle_timeout = idle_timeout
+        self.session = None
+        self.refcount = 0
+        self.loop = None
+        self.lock = None
+        self.task = None
+        self.closing = None
+        self.idle_handle = None
+
+    async def _serve(self, ready: asyncio.Future, closing: asyncio.Event):
+        # The stdio client must be entered and exited by the same task, so it lives here
+        try:
+            async with stdio_client(self.params) as streams:
+                async with WatchedSession(*streams) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    # Until we are asked to close, or the server goes away
+                    waits = [asyncio.create_task(closing.wait()), asyncio.create_task(session.lost.wait())]
+                    try:
+                        await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for wait in waits:
+                            wait.cancel()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, Exception):
+                raise
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # A new event loop (e.g. another asyncio.run) can't reuse the old loop's session
+            self.loop = loop
+            self.lock = asyncio.Lock()
+            self.session = self.task = self.closing = self.idle_handle = None
+            self.refcount = 0
+
+    def _alive(self) -> bool:
+        return self.session is not None and not self.task.done() and not self.session.lost.is_set()
+
+    async def _connect(self):
+        ready = self.loop.create_future()
+        closing = asyncio.Event()
+        task = asyncio.create_task(self._serve(ready, closing))
+        self.session = await ready
+        self.task, self.closing = task, closing
+
+    async def _disconnect(self):
+        task, closing = self.task, self.closing
+        self.session = self.task = self.closing = None
+        if task:
+            closing.set()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _discard(self, session: mcp.ClientSession):
+        """Tear down session if it is still the current one, e.g. after it lost its connection."""
+        async with self.lock:
+            if self.session is session:
+                await self._disconnect()
+
+    async def get_session(self) -> mcp.ClientSession:
+        async with self.lock:
+            if not self._alive():
+                await self._disconnect()
+                await self._connect()
+            return self.session
+
+    async def acquire(self) -> mcp.ClientSession:
+        self._bind_loop()
+        self.refcount += 1
+        if self.idle_handle:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        try:
+            return await self.get_session()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        self.refcount -= 1
+        if self.refcount == 0 and self.loop and not self.loop.is_closed():
+            self.idle_handle = self.loop.call_later(
+                self.idle_timeout, lambda: asyncio.ensure_future(self._close_if_idle())
+            )
+
+    async def _close_if_idle(self):
+        async with self.lock:
+            if self.refcount == 0:
+                await self._disconnect()
+
+    async def call(self, request, idempotent: bool = True):
+        """
+        Run request(session) on the shared session. If the connection was lost, reconnect and run it
+        again once, unless it isn't idempotent and may already have reached the server.
+        """
+        session = await self.acquire()
+        try:
+            try:
+                return await request(session)
+            except Exception as e:
+                if not connection_lost(e):
+                    raise
+                await self._discard(session)
+                if not idempotent and not never_sent(e):
+                    raise
+                return await request(await self.get_session())
+        finally:
+            self.release()
+
+    async def close(self):
+        if self.loop is asyncio.get_running_loop():
+            if self.idle_handle:
+                self.idle_handle.cancel()
+                self.idle_handle = None
+            async with self.lock:
+                await self._disconnect()
+
+
+accounts_session = MCPSessionManager(params)
+
+
+async def close_accounts_session():
+    await accounts_session.close()
+
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    tools_result = await accounts_session.call(lambda session: session.list_tools())
+    return tools_result.tools
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    return await accounts_session.call(
+        lambda session: session.call_tool(tool_name, tool_args), idempotent=tool_name not in MUTATING_TOOLS
+    )
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    result = await accounts_session.call(lambda session: session.read_resource(f"accounts://accounts_server/{name}"))
+    return result.contents[0].text
+
+async def read_summary_resource(name):
+    result = await accounts_session.call(lambda session: session.read_resource(f"accounts://summary/{name}"))
+    return result.contents[0].text
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    result = await accounts_session.call(lambda session: session.read_resource(f"accounts://strategy/{name}"))
+    return result.contents[0].text
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +209,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
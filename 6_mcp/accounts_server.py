@@ -1,5 +1,5 @@
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from account_service import account_service
 
 mcp = FastMCP("accounts_server")
 
@@ -10,7 +10,7 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    return account_service.get(name).balance
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +19,7 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    return dict(account_service.get(name).holdings)
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +31,7 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    return await account_service.buy_shares(name, symbol, quantity, rationale)
 
 
 @mcp.tool()
@@ -44,7 +44,7 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    return await account_service.sell_shares(name, symbol, quantity, rationale)
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +54,27 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    return await account_service.change_strategy(name, strategy)
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    return account_service.get(name).report()
+
+@mcp.resource("accounts://summary/{name}")
+async def read_summary_resource(name: str) -> str:
+    return account_service.get(name).summary()
+
+@mcp.resource("accounts://transactions/{name}")
+async def read_transactions_resource(name: str) -> str:
+    return account_service.get(name).transactions_page()
+
+@mcp.resource("accounts://transactions/{name}/{before_id}")
+async def read_transactions_page_resource(name: str, before_id: str) -> str:
+    return account_service.get(name).transactions_page(int(before_id))
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    return account_service.get(name).get_strategy()
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -1,10 +1,21 @@
 import gradio as gr
 from util import css, js, Color
 import pandas as pd
+import threading
+from collections import deque
 from trading_floor import names, lastnames, short_model_names
 import plotly.express as px
 from accounts import Account
-from database import read_log
+from downsample import lttb
+from metrics import summarize
+from database import read_log_since, read_transactions_page, database_watcher
+from events import feed
+
+LOG_LINES = 13
+TRANSACTIONS_SHOWN = 50
+CHART_POINTS = 500
+METRICS_HOURS = 24
+METRICS_COLUMNS = ["Trader", "Kind", "Model / Tool", "Server", "Count", "p50 ms", "p95 ms", "p99 ms", "Tokens in", "Tokens out", "Cost $"]
 
 mapper = {
     "trace": Color.WHITE,
@@ -17,28 +28,69 @@ mapper = {
 
 
 class Trader:
+    """
+    One trader's data for the UI, shared by every viewer. It is only re-read from the database
+    when the change feed says the account or its logs have changed, and logs are fetched
+    incrementally from the id of the last row seen.
+    """
+
     def __init__(self, name: str, lastname: str, model_name: str):
         self.name = name
         self.lastname = lastname
         self.model_name = model_name
+        self.lock = threading.Lock()
+        self.account_version = feed.version("account", name)
         self.account = Account.get(name)
+        self.view_version = None
+        self.view = None
+        self.chart_points = None
+        self.chart = None
+        self.chart_version = 0
+        self.log_version = None
+        self.log_cursor = 0
+        self.log_rows = deque(maxlen=LOG_LINES)
+        self.logs_html = ""
 
     def reload(self):
+        self.account_version = feed.version("account", self.name)
         self.account = Account.get(self.name)
 
+    def get_view(self) -> tuple[int, int, tuple]:
+        """
+        Return the account version, the chart version and the rendered outputs,
+        rebuilding them only after a change.
+        """
+        with self.lock:
+            if feed.version("account", self.name) != self.account_version:
+                self.reload()
+            if self.view_version != self.account_version:
+                self.view = (
+                    self.get_portfolio_value(),
+                    self.get_portfolio_value_chart(),
+                    self.get_holdings_df(),
+                    self.get_transactions_df(),
+                )
+                self.view_version = self.account_version
+            return self.view_version, self.chart_version, self.view
+
     def get_title(self) -> str:
         return f"<div style='text-align: center;font-size:34px;'>{self.name}<span style='color:#ccc;font-size:24px;'> ({self.model_name}) - {self.lastname}</span></div>"
 
     def get_strategy(self) -> str:
         return self.account.get_strategy()
 
-    def get_portfolio_value_df(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.account.portfolio_value_time_series, columns=["datetime", "value"])
+    def get_portfolio_value_df(self, points=None) -> pd.DataFrame:
+        if points is None:
+            points = lttb(self.account.portfolio_value_time_series, CHART_POINTS)
+        df = pd.DataFrame(points, columns=["datetime", "value"])
         df["datetime"] = pd.to_datetime(df["datetime"])
         return df
 
     def get_portfolio_value_chart(self):
-        df = self.get_portfolio_value_df()
+        points = lttb(self.account.portfolio_value_time_series, CHART_POINTS)
+        if points == self.chart_points:
+            return self.chart
+        df = self.get_portfolio_value_df(points)
         fig = px.line(df, x="datetime", y="value")
         margin = dict(l=40, r=20, t=20, b=40)
         fig.update_layout(
@@ -51,6 +103,8 @@ class Trader:
         )
         fig.update_xaxes(tickformat="%m/%d", tickangle=45, tickfont=dict(size=8))
         fig.update_yaxes(tickfont=dict(size=8), tickformat=",.0f")
+        self.chart_points, self.chart = points, fig
+        self.chart_version += 1
         return fig
 
     def get_holdings_df(self) -> pd.DataFrame:
@@ -65,12 +119,12 @@ class Trader:
         return df
 
     def get_transactions_df(self) -> pd.DataFrame:
-        """Convert transactions to DataFrame for display"""
-        transactions = self.account.list_transactions()
+        """Convert the latest transactions to DataFrame for display, oldest first"""
+        transactions = read_transactions_page(self.name, TRANSACTIONS_SHOWN)
         if not transactions:
             return pd.DataFrame(columns=["Timestamp", "Symbol", "Quantity", "Price", "Rationale"])
 
-        return pd.DataFrame(transactions)
+        return pd.DataFrame(transactions[::-1]).drop(columns="id")
 
     def get_portfolio_value(self) -> str:
         """Calculate total portfolio value based on current prices"""
@@ -80,14 +134,24 @@ class Trader:
         emoji = "⬆" if pnl >= 0 else "⬇"
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
+    def update_logs(self) -> str:
+        with self.lock:
+            version = feed.version("logs", self.name)
+            if version != self.log_version:
+                self.log_version = version
+                rows = read_log_since(self.name, self.log_cursor, last_n=LOG_LINES)
+                if rows or not self.logs_html:
+                    self.log_rows.extend(rows)
+                    self.log_cursor = self.log_rows[-1][0] if self.log_rows else 0
+                    response = ""
+                    for _, timestamp, type, message in self.log_rows:
+                        color = mapper.get(type, Color.WHITE).value
+                        response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
+                    self.logs_html = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+            return self.logs_html
+
     def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
-        response = ""
-        for log in logs:
-            timestamp, type, message = log
-            color = mapper.get(type, Color.WHITE).value
-            response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+        response = self.update_logs()
         if response != previous:
             return response
         return gr.update()
@@ -102,19 +166,19 @@ class TraderView:
         self.transactions_table = None
 
     def make_ui(self):
+        version, chart_version, (portfolio_value, chart, holdings, transactions) = self.trader.get_view()
+        self.version = gr.State((version, chart_version))
         with gr.Column():
             gr.HTML(self.trader.get_title())
             with gr.Row():
-                self.portfolio_value = gr.HTML(self.trader.get_portfolio_value)
+                self.portfolio_value = gr.HTML(portfolio_value)
             with gr.Row():
-                self.chart = gr.Plot(
-                    self.trader.get_portfolio_value_chart, container=True, show_label=False
-                )
+                self.chart = gr.Plot(chart, container=True, show_label=False)
             with gr.Row(variant="panel"):
                 self.log = gr.HTML(self.trader.get_logs)
             with gr.Row():
                 self.holdings_table = gr.Dataframe(
-                    value=self.trader.get_holdings_df,
+                    value=holdings,
                     label="Holdings",
                     headers=["Symbol", "Quantity"],
                     row_count=(5, "dynamic"),
@@ -124,7 +188,7 @@ class TraderView:
                 )
             with gr.Row():
                 self.transactions_table = gr.Dataframe(
-                    value=self.trader.get_transactions_df,
+                    value=transactions,
                     label="Recent Transactions",
                     headers=["Timestamp", "Symbol", "Quantity", "Price", "Rationale"],
                     row_count=(5, "dynamic"),
@@ -133,11 +197,13 @@ class TraderView:
                     elem_classes=["dataframe-fix"],
                 )
 
-        timer = gr.Timer(value=120)
+        # Both timers only compare in-memory versions; the database is read when something changed
+        timer = gr.Timer(value=2)
         timer.tick(
             fn=self.refresh,
-            inputs=[],
+            inputs=[self.version],
             outputs=[
+                self.version,
                 self.portfolio_value,
                 self.chart,
                 self.holdings_table,
@@ -155,20 +221,79 @@ class TraderView:
             queue=False,
         )
 
-    def refresh(self):
-        self.trader.reload()
-        return (
-            self.trader.get_portfolio_value(),
-            self.trader.get_portfolio_value_chart(),
-            self.trader.get_holdings_df(),
-            self.trader.get_transactions_df(),
+    def refresh(self, seen):
+        version, chart_version, (portfolio_value, chart, holdings, transactions) = self.trader.get_view()
+        if seen == (version, chart_version):
+            return (seen, gr.update(), gr.update(), gr.update(), gr.update())
+        if seen[1] == chart_version:
+            chart = gr.update()
+        return ((version, chart_version), portfolio_value, chart, holdings, transactions)
+
+
+class MetricsView:
+    """Latency percentiles, tokens and cost per trader, model and tool; rebuilt only when new metrics arrive."""
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        self.lock = threading.Lock()
+        self.version = None
+        self.df = None
+
+    def get_df(self) -> tuple[int, pd.DataFrame]:
+        with self.lock:
+            version = sum(feed.version("metrics", name) for name in self.names)
+            if version != self.version:
+                rows = [
+                    [
+                        row["trader"],
+                        row["kind"],
+                        row["label"],
+                        row["server"],
+                        row["count"],
+                        round(row["p50_ms"]),
+                        round(row["p95_ms"]),
+                        round(row["p99_ms"]),
+                        row["input_tokens"],
+                        row["output_tokens"],
+                        round(row["cost"], 4),
+                    ]
+                    for row in summarize(METRICS_HOURS)
+                ]
+                self.df = pd.DataFrame(rows, columns=METRICS_COLUMNS)
+                self.version = version
+            return self.version, self.df
+
+    def make_ui(self):
+        version, df = self.get_df()
+        self.seen = gr.State(version)
+        with gr.Row(variant="panel"):
+            self.table = gr.Dataframe(
+                value=df,
+                label=f"Latency, tokens and cost (last {METRICS_HOURS} hours)",
+                headers=METRICS_COLUMNS,
+                max_height=400,
+            )
+        timer = gr.Timer(value=5)
+        timer.tick(
+            fn=self.refresh,
+            inputs=[self.seen],
+            outputs=[self.seen, self.table],
+            show_progress="hidden",
+            queue=False,
         )
 
+    def refresh(self, seen):
+        version, df = self.get_df()
+        if version == seen:
+            return seen, gr.update()
+        return version, df
+
 
 # Main UI construction
 def create_ui():
     """Create the main Gradio UI for the trading simulation"""
 
+    database_watcher.start()
     traders = [
         Trader(trader_name, lastname, model_name)
         for trader_name, lastname, model_name in zip(names, lastnames, short_model_names)
@@ -181,6 +306,7 @@ def create_ui():
         with gr.Row():
             for trader_view in trader_views:
                 trader_view.make_ui()
+        MetricsView(names).make_ui()
 
     return ui
 
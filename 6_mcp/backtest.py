@@ -0,0 +1,306 @@
+"""
+Backtest the trading floor offline by replaying the end of day prices in the market store.
+
+A simulated clock steps over the stored dates; on each one every price lookup is served from that
+date's prices, and each Trader runs with a scripted model that follows a deterministic policy and
+with its account tools called in-process, so no model API, MCP server or market API is used.
+Results are written to a separate database (BACKTEST_DB, default backtest.db), never accounts.db.
+Import any older JSON rows from the market table first with market_store.py.
+
+Usage: uv run backtest.py [--start 2025-01-02] [--end 2025-06-30] [--policy momentum] [--traders Warren Ray]
+"""
+
+import os
+
+# The database location is read when database.py is imported, so it must be set first
+os.environ["ACCOUNTS_DB"] = os.getenv("BACKTEST_DB", "backtest.db")
+# The model is scripted and never calls out, but the OpenAI clients in traders.py need a key to be created
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Callable
+from agents import Agent, Model, ModelResponse, Usage, function_tool, set_tracing_disabled
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+)
+import market
+from market_store import MarketStore, MarketDay, MARKET_STORE_DIR
+from accounts import Account, SPREAD
+from account_service import account_service
+from database import read_portfolio_snapshots, log_writer
+from traders import Trader
+from templates import trader_instructions
+from trading_floor import names, lastnames, model_names
+from reset import waren_strategy, george_strategy, ray_strategy, cathie_strategy
+
+# The market store the days are replayed from
+MARKET_DIR = os.getenv("BACKTEST_MARKET_DIR", MARKET_STORE_DIR)
+
+DEFAULT_SYMBOLS = os.getenv(
+    "BACKTEST_SYMBOLS",
+    "AAPL,MSFT,NVDA,AMZN,GOOGL,META,TSLA,JPM,V,XOM,JNJ,WMT,PG,KO,SPY,QQQ,IBIT,ARKK",
+).split(",")
+
+STRATEGIES = {
+    "Warren": waren_strategy,
+    "George": george_strategy,
+    "Ray": ray_strategy,
+    "Cathie": cathie_strategy,
+}
+
+
+# Policies decide a day's trades from the account and the prices on the day and the day before
+
+def momentum(account: Account, today: MarketDay, yesterday: MarketDay, symbols: list[str]) -> list[tuple[str, dict]]:
+    """Sell holdings that fell since the prior day, and buy the three biggest risers with a tenth of the cash each."""
+    changes = {s: today[s] / yesterday[s] - 1 for s in symbols if today.get(s) and yesterday.get(s)}
+    calls = []
+    for symbol, quantity in sorted(account.holdings.items()):
+        if changes.get(symbol, 0.0) < 0:
+            rationale = f"{symbol} fell {changes[symbol]:.1%}"
+            calls.append(("sell_shares", {"name": account.name, "symbol": symbol, "quantity": quantity, "rationale": rationale}))
+    risers = sorted((s for s in changes if changes[s] > 0), key=lambda s: (-changes[s], s))[:3]
+    for symbol in risers:
+        quantity = int(account.balance / 10 // (today[symbol] * (1 + SPREAD)))
+        if quantity:
+            rationale = f"{symbol} rose {changes[symbol]:.1%}"
+            calls.append(("buy_shares", {"name": account.name, "symbol": symbol, "quantity": quantity, "rationale": rationale}))
+    return calls
+
+
+def buy_and_hold(account: Account, today: MarketDay, yesterday: MarketDay, symbols: list[str]) -> list[tuple[str, dict]]:
+    """Spread the cash equally across the symbols on the first day, then hold."""
+    if account.holdings:
+        return []
+    priced = [s for s in symbols if today.get(s)]
+    calls = []
+    for symbol in priced:
+        quantity = int(account.balance * 0.95 / len(priced) // (today[symbol] * (1 + SPREAD)))
+        if quantity:
+            rationale = "Equal weight buy and hold"
+            calls.append(("buy_shares", {"name": account.name, "symbol": symbol, "quantity": quantity, "rationale": rationale}))
+    return calls
+
+
+POLICIES = {"momentum": momentum, "buy_and_hold": buy_and_hold}
+
+
+# In-process equivalents of the accounts and market MCP server tools; like those, trades go through the
+# account service, which applies a turn's parallel calls in the order they were made
+
+@function_tool
+async def get_balance(name: str) -> float:
+    """Get the cash balance of the given account name.
+
+    Args:
+        name: The name of the account holder
+    """
+    return account_service.get(name).balance
+
+
+@function_tool
+async def get_holdings(name: str) -> dict[str, int]:
+    """Get the holdings of the given account name.
+
+    Args:
+        name: The name of the account holder
+    """
+    return dict(account_service.get(name).holdings)
+
+
+@function_tool
+async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> str:
+    """Buy shares of a stock.
+
+    Args:
+        name: The name of the account holder
+        symbol: The symbol of the stock
+        quantity: The quantity of shares to buy
+        rationale: The rationale for the purchase and fit with the account's strategy
+    """
+    return await account_service.buy_shares(name, symbol, quantity, rationale)
+
+
+@function_tool
+async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) -> str:
+    """Sell shares of a stock.
+
+    Args:
+        name: The name of the account holder
+        symbol: The symbol of the stock
+        quantity: The quantity of shares to sell
+        rationale: The rationale for the sale and fit with the account's strategy
+    """
+    return await account_service.sell_shares(name, symbol, quantity, rationale)
+
+
+@function_tool
+async def lookup_share_prices(symbols: list[str]) -> dict[str, float]:
+    """This tool provides the current prices of several stock symbols in one call.
+
+    Args:
+        symbols: the symbols of the stocks
+    """
+    return market.get_share_prices(symbols)
+
+
+TOOLS = [get_balance, get_holdings, buy_shares, sell_shares, lookup_share_prices]
+
+
+class ScriptedModel(Model):
+    """
+    Stands in for the LLM: the first turn requests the tool calls the policy chose, and once the
+    tools have answered it replies with a short summary. Streamed runs get the same turn as a single
+    completed response event.
+    """
+
+    def __init__(self, calls: list[tuple[str, dict]]):
+        self.calls = calls
+
+    def output(self, input) -> list:
+        items = input if isinstance(input, list) else []
+        results = [item for item in items if isinstance(item, dict) and item.get("type") == "function_call_output"]
+        if self.calls and not results:
+            return [
+                ResponseFunctionToolCall(type="function_call", call_id=f"call_{i}", name=name, arguments=json.dumps(args))
+                for i, (name, args) in enumerate(self.calls)
+            ]
+        text = f"Made {len(results)} trades today." if results else "No trades today."
+        return [
+            ResponseOutputMessage(
+                id="msg_0",
+                type="message",
+                role="assistant",
+                status="completed",
+                content=[ResponseOutputText(type="output_text", text=text, annotations=[])],
+            )
+        ]
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> ModelResponse:
+        return ModelResponse(output=self.output(input), usage=Usage(), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        response = Response(
+            id="resp_scripted",
+            created_at=time.time(),
+            model="scripted",
+            object="response",
+            output=self.output(input),
+            parallel_tool_calls=True,
+            tool_choice="auto",
+            tools=[],
+        )
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=0)
+
+
+class BacktestTrader(Trader):
+    """A Trader whose model is scripted by the backtest's policy and whose tools run in-process."""
+
+    def __init__(self, name: str, lastname: str, model_name: str, backtest: "Backtest"):
+        super().__init__(name, lastname, model_name)
+        self.backtest = backtest
+
+    async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
+        backtest = self.backtest
+        calls = backtest.policy(Account.get(self.name), backtest.today, backtest.yesterday, backtest.symbols)
+        self.agent = Agent(
+            name=self.name,
+            instructions=trader_instructions(self.name),
+            model=ScriptedModel(calls),
+            tools=TOOLS,
+        )
+        return self.agent
+
+    async def get_account_report(self) -> str:
+        return Account.get(self.name).summary()
+
+    async def get_strategy(self) -> str:
+        return Account.get(self.name).get_strategy()
+
+    async def run_with_mcp_servers(self, fleet=None, prefetched=None):
+        await self.run_agent([], [], prefetched)
+
+
+class Backtest:
+    def __init__(self, policy: Callable, symbols: list[str] = DEFAULT_SYMBOLS, market_dir: str = MARKET_DIR):
+        self.policy = policy
+        self.symbols = symbols
+        self.store = MarketStore(market_dir)
+        self.today = None
+        self.yesterday = None
+
+    def market_days(self, start: str | None = None, end: str | None = None):
+        """Yield (date, prices) for each stored market date in the range."""
+        for date in self.store.dates():
+            if (start or "") <= date <= (end or "9999"):
+                yield date, self.store.get_day(date)
+
+    async def run(self, traders: list[BacktestTrader], start: str | None = None, end: str | None = None) -> dict:
+        for trader in traders:
+            Account.get(trader.name).reset(STRATEGIES.get(trader.name, ""))
+        days = 0
+        started = time.perf_counter()
+        try:
+            for date, prices in self.market_days(start, end):
+                self.yesterday, self.today = self.today or prices, prices
+                market.simulate(datetime.strptime(date, "%Y-%m-%d").replace(hour=10), prices)
+                for trader in traders:
+                    await trader.run()
+                days += 1
+            results = {trader.name: self.summarize(trader.name) for trader in traders}
+        finally:
+            market.simulate(None)
+            log_writer.flush()
+        elapsed = time.perf_counter() - started
+        return {"days": days, "seconds": elapsed, "traders": results}
+
+    @staticmethod
+    def summarize(name: str) -> dict:
+        account = Account.get(name)
+        value = account.calculate_portfolio_value()
+        peak, drawdown = 0.0, 0.0
+        for _, snapshot in read_portfolio_snapshots(name):
+            peak = max(peak, snapshot)
+            drawdown = max(drawdown, 1 - snapshot / peak if peak else 0.0)
+        return {
+            "portfolio_value": value,
+            "profit_loss": account.calculate_profit_loss(value),
+            "trades": len(account.transactions),
+            "max_drawdown": drawdown,
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay stored market days through the traders, offline")
+    parser.add_argument("--start", help="First date to replay, YYYY-MM-DD")
+    parser.add_argument("--end", help="Last date to replay, YYYY-MM-DD")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="momentum")
+    parser.add_argument("--traders", nargs="+", default=names)
+    parser.add_argument("--symbols", nargs="+", default=DEFAULT_SYMBOLS)
+    args = parser.parse_args()
+
+    set_tracing_disabled(True)
+    backtest = Backtest(POLICIES[args.policy], args.symbols)
+    details = {name: (lastname, model_name) for name, lastname, model_name in zip(names, lastnames, model_names)}
+    traders = [BacktestTrader(name, *details.get(name, ("Trader", "scripted")), backtest) for name in args.traders]
+    results = await backtest.run(traders, args.start, args.end)
+
+    days, seconds = results["days"], results["seconds"]
+    print(f"Replayed {days} days in {seconds:.1f}s ({days / seconds if seconds else 0:.1f} days/sec) into {os.environ['ACCOUNTS_DB']}")
+    for name, result in results["traders"].items():
+        print(
+            f"{name}: ${result['portfolio_value']:,.0f} (P&L ${result['profit_loss']:,.0f}), "
+            f"{result['trades']} trades, max drawdown {result['max_drawdown']:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
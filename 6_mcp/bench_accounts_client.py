@@ -0,0 +1,73 @@
+"""
+Benchmark of calls to the accounts MCP server: one server process and handshake per call, as
+accounts_client used to do, against MCPSessionManager's pooled session, sequentially and with
+concurrent calls pipelined over the one session. Each call reads an account's strategy resource.
+The server runs on a throwaway database, and logs each request on stderr.
+
+Usage: uv run bench_accounts_client.py [--calls 5] [--concurrent 20] [--uv] [--db /tmp/bench_accounts_client.db] 2>/dev/null
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import mcp
+from mcp import StdioServerParameters
+from mcp.client.stdio import stdio_client
+from accounts_client import MCPSessionManager
+
+NAME = "warren"
+
+
+async def read_strategy(session: mcp.ClientSession) -> str:
+    result = await session.read_resource(f"accounts://strategy/{NAME}")
+    return result.contents[0].text
+
+
+async def cold_call(params: StdioServerParameters) -> str:
+    async with stdio_client(params) as streams:
+        async with mcp.ClientSession(*streams) as session:
+            await session.initialize()
+            return await read_strategy(session)
+
+
+async def main(calls: int, concurrent: int, use_uv: bool, db: str) -> None:
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "accounts_server.py")
+    command, server_args = ("uv", ["run", server]) if use_uv else (sys.executable, [server])
+    params = StdioServerParameters(command=command, args=server_args, env={**os.environ, "ACCOUNTS_DB": db})
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        await cold_call(params)
+    cold = (time.perf_counter() - start) / calls
+    print(f"Cold, one process per call:   {1000 * cold:8.1f}ms/call over {calls} calls")
+
+    manager = MCPSessionManager(params)
+    try:
+        start = time.perf_counter()
+        await manager.call(read_strategy)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(calls):
+            await manager.call(read_strategy)
+        pooled = (time.perf_counter() - start) / calls
+        start = time.perf_counter()
+        await asyncio.gather(*(manager.call(read_strategy) for _ in range(concurrent)))
+        together = time.perf_counter() - start
+    finally:
+        await manager.close()
+    print(f"Pooled, first call:           {1000 * first:8.1f}ms (starts the server)")
+    print(f"Pooled, after that:           {1000 * pooled:8.1f}ms/call over {calls} calls")
+    print(f"Pooled, {concurrent} concurrent calls: {1000 * together:8.1f}ms in all")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time accounts MCP calls with and without the pooled session")
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--concurrent", type=int, default=20)
+    parser.add_argument("--uv", action="store_true", help="Start the server with uv run, as accounts_client does")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_accounts_client.db"))
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.concurrent, args.uv, args.db))
@@ -0,0 +1,116 @@
+"""
+Benchmark of database writes under concurrent writers. N threads each make trades, every trade
+saving two accounts and writing two log lines: first the way database.py used to, with a fresh
+connection and a commit per call on a rollback-journal database, then through database.py's pooled
+per-thread WAL connections, with each trade's account writes in one transaction and the logs batched
+by the log writer. Reports trades and operations per second for each. The databases are throwaway.
+
+Usage: uv run bench_database.py [--writers 1 4 8] [--trades 300] [--db /tmp/bench_database.db]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description="Compare per-call connections with the pooled WAL connection")
+parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 8])
+parser.add_argument("--trades", type=int, default=300, help="Trades per writer thread")
+parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_database.db"))
+args = parser.parse_args()
+PER_CALL_DB = args.db.removesuffix(".db") + "_per_call.db"
+# Fresh databases, chosen before database.py is imported, which opens its own
+for path in (args.db, PER_CALL_DB):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+os.environ["ACCOUNTS_DB"] = args.db
+
+import database
+
+OPERATIONS_PER_TRADE = 4
+
+
+# How database.py wrote before: a connection per call, committed straight away
+
+def per_call_setup() -> None:
+    with sqlite3.connect(PER_CALL_DB) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, datetime DATETIME, type TEXT, message TEXT)"
+        )
+
+
+def per_call_write_account(name: str, account: dict) -> None:
+    with sqlite3.connect(PER_CALL_DB) as conn:
+        conn.execute(
+            "INSERT INTO accounts (name, account) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET account=excluded.account",
+            (name, json.dumps(account)),
+        )
+        conn.commit()
+
+
+def per_call_write_log(name: str, type: str, message: str) -> None:
+    with sqlite3.connect(PER_CALL_DB) as conn:
+        conn.execute(
+            "INSERT INTO logs (name, datetime, type, message) VALUES (?, datetime('now'), ?, ?)", (name, type, message)
+        )
+        conn.commit()
+
+
+def per_call_trade(name: str, i: int) -> None:
+    per_call_write_account(name, {"balance": 10_000 - i, "strategy": "", "holdings": {"AAPL": i}})
+    per_call_write_log(name, "account", f"Bought {i}")
+    per_call_write_account(name, {"balance": 10_000 - i, "strategy": "", "holdings": {"AAPL": i}})
+    per_call_write_log(name, "account", f"Recorded {i}")
+
+
+def pooled_trade(name: str, i: int) -> None:
+    with database.transaction():
+        database.write_account(name, 10_000 - i, "")
+        database.write_log(name, "account", f"Bought {i}")
+        database.write_account(name, 10_000 - i, "")
+        database.write_log(name, "account", f"Recorded {i}")
+
+
+def run(trade, writers: int, trades: int) -> tuple[float, int]:
+    """Trades per second across the writer threads, and how many trades failed."""
+    errors = []
+
+    def writer(n: int) -> None:
+        for i in range(trades):
+            try:
+                trade(f"bench_{n}", i)
+            except sqlite3.OperationalError:
+                errors.append(i)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The logs count once they are committed
+    database.log_writer.flush()
+    return writers * trades / (time.perf_counter() - start), len(errors)
+
+
+def main() -> None:
+    per_call_setup()
+    print(f"{'writers':>7} {'per-call trades/s':>18} {'ops/s':>8} {'pooled trades/s':>16} {'ops/s':>8}")
+    for writers in args.writers:
+        before, before_errors = run(per_call_trade, writers, args.trades)
+        after, after_errors = run(pooled_trade, writers, args.trades)
+        print(
+            f"{writers:>7} {before:>18,.0f} {before * OPERATIONS_PER_TRADE:>8,.0f} "
+            f"{after:>16,.0f} {after * OPERATIONS_PER_TRADE:>8,.0f}"
+        )
+        if before_errors or after_errors:
+            print(f"        failed trades: {before_errors} per-call, {after_errors} pooled")
+
+
+if __name__ == "__main__":
+    main()
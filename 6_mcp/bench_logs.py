@@ -0,0 +1,107 @@
+"""
+Benchmark of the logs table. Seeds a database with millions of log rows spread over the last 60 days
+across several traders, then times read_log against the old full-scan query, compacts everything
+past the retention period with compact_logs and checks the hourly rollups account for every row
+it removed. The logs live in their own database.
+
+Usage: uv run bench_logs.py [--rows 3000000] [--db /tmp/bench_logs.db]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser(description="Time read_log and compact_logs on a large logs table")
+parser.add_argument("--rows", type=int, default=3_000_000)
+parser.add_argument("--days", type=float, default=60.0, help="How far back the seeded rows go")
+parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_logs.db"))
+args = parser.parse_args()
+# A fresh database, chosen before database.py is imported, which opens it
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(args.db + suffix):
+        os.remove(args.db + suffix)
+os.environ["ACCOUNTS_DB"] = args.db
+
+import database
+
+NAMES = ["warren", "george", "ray", "cathie", "trader_4", "trader_5", "trader_6", "trader_7"]
+TYPES = ["trace", "agent", "function", "generation", "response", "account"]
+READ_LINES = 13
+SAMPLES = 50
+
+# The query read_log ran before the (name, id) index, with the index ruled out
+OLD_READ_LOG = f"""
+    SELECT datetime, type, message FROM logs NOT INDEXED
+    WHERE name = ?
+    ORDER BY datetime DESC
+    LIMIT {READ_LINES}
+"""
+
+
+def seed(rows: int, days: float) -> None:
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    step = days * 86400 / rows
+    with database.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO logs (name, datetime, type, message) VALUES (?, ?, ?, ?)",
+            (
+                (NAMES[i % len(NAMES)], (start + timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S"), TYPES[i % len(TYPES)], "x" * 80)
+                for i in range(rows)
+            ),
+        )
+
+
+def timed(read) -> str:
+    times = []
+    for i in range(SAMPLES):
+        start = time.perf_counter()
+        read(NAMES[i % len(NAMES)])
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return f"median {1000 * times[len(times) // 2]:.2f}ms, p95 {1000 * times[int(len(times) * 0.95)]:.2f}ms"
+
+
+def counts() -> Counter:
+    rows = database.get_connection().execute("SELECT name, type, count(*) FROM logs GROUP BY 1, 2").fetchall()
+    return Counter({(name, type): count for name, type, count in rows})
+
+
+def main() -> None:
+    start = time.perf_counter()
+    seed(args.rows, args.days)
+    print(f"Seeded {args.rows:,} log rows over {args.days:.0f} days in {time.perf_counter() - start:.1f}s")
+    conn = database.get_connection()
+    print(f"Old query (full scan):  {timed(lambda name: conn.execute(OLD_READ_LOG, (name,)).fetchall())}")
+    print(f"read_log:               {timed(lambda name: database.read_log(name, last_n=READ_LINES))}")
+
+    seeded = counts()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=database.LOG_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+    compacted = database.compact_logs()
+    print(f"compact_logs rolled up {compacted:,} rows older than {database.LOG_RETENTION_DAYS:.0f} days in {time.perf_counter() - start:.1f}s")
+    print(f"read_log after:         {timed(lambda name: database.read_log(name, last_n=READ_LINES))}")
+
+    # Every row that went must be counted in the rollups, under its own trader and type
+    removed = seeded - counts()
+    rolled_up = Counter()
+    for name in NAMES:
+        for _, type, count in database.read_log_rollups(name):
+            rolled_up[(name, type)] += count
+    problems = []
+    if sum(removed.values()) != compacted:
+        problems.append(f"{sum(removed.values()):,} rows are gone but compact_logs reported {compacted:,}")
+    if rolled_up != removed:
+        problems.append("the rollup counts don't match the rows removed")
+    oldest, = conn.execute("SELECT min(datetime) FROM logs").fetchone()
+    if oldest is not None and oldest < cutoff:
+        problems.append(f"raw rows from {oldest} are still there, past the retention period")
+    print("\n".join(problems) or "Rollups account for every compacted row")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of live share price lookups: one snapshot request per symbol against the bulk lookup,
+which prices the whole list with the snapshot-all endpoint. Polygon is replaced by a stand-in client
+that sleeps for a fixed latency per request, so this needs no API key and makes no network calls.
+
+Usage: uv run bench_market.py [--latency-ms 20] [--symbols 5 50 500]
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+import market
+
+
+class SlowClient:
+    """Answers snapshot requests like Polygon's RESTClient, after latency seconds each."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+
+    def snapshot(self, ticker: str):
+        price = 10.0 + sum(map(ord, ticker)) % 500
+        return SimpleNamespace(ticker=ticker, min=SimpleNamespace(close=price), prev_day=SimpleNamespace(close=price - 1))
+
+    def get_snapshot_ticker(self, market_type: str, ticker: str):
+        self.requests += 1
+        time.sleep(self.latency)
+        return self.snapshot(ticker)
+
+    def get_snapshot_all(self, market_type: str, tickers: list[str]):
+        self.requests += 1
+        time.sleep(self.latency)
+        return [self.snapshot(ticker) for ticker in tickers]
+
+
+def timed(client: SlowClient, lookup) -> tuple[dict[str, float], int, float]:
+    market.price_cache.clear()
+    client.requests = 0
+    start = time.perf_counter()
+    prices = lookup()
+    return prices, client.requests, time.perf_counter() - start
+
+
+def main(latency_ms: float, sizes: list[int]) -> None:
+    client = SlowClient(latency_ms / 1000)
+    market.get_client = lambda: client
+    market.is_paid_polygon = True
+    print(f"{'symbols':>8} {'per symbol':>22} {'bulk':>18}")
+    for size in sizes:
+        symbols = [f"S{i:04d}" for i in range(size)]
+        single, single_requests, single_seconds = timed(
+            client, lambda: {symbol: market.get_share_price_polygon(symbol) for symbol in symbols}
+        )
+        bulk, bulk_requests, bulk_seconds = timed(client, lambda: market.get_share_prices_polygon(symbols))
+        assert single == bulk, "the two lookups disagree"
+        print(
+            f"{size:>8} {single_requests:>6} calls {single_seconds * 1000:>7.0f}ms "
+            f"{bulk_requests:>6} calls {bulk_seconds * 1000:>5.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-symbol and bulk share price lookups")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated latency of each Polygon request")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[5, 50, 500])
+    args = parser.parse_args()
+    main(args.latency_ms, args.symbols)
@@ -0,0 +1,24 @@
+"""
+Points the tests at a throwaway database. database.py opens its database when it is first imported,
+so the location is set here, before any test module is collected, and is shared by all of them;
+the directory is removed once the run is over.
+"""
+
+import os
+import tempfile
+import pytest
+
+directory = tempfile.TemporaryDirectory(prefix="test_accounts_")
+os.environ["ACCOUNTS_DB"] = os.environ["BACKTEST_DB"] = os.path.join(directory.name, "accounts.db")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def throwaway_database():
+    import database
+
+    assert database.DB == os.environ["ACCOUNTS_DB"], "refusing to run against a database from .env"
+    yield
+    database.log_writer.shutdown()
+    database.metrics_writer.shutdown()
+    database.close_connection()
+    directory.cleanup()
@@ -1,17 +1,184 @@
 import sqlite3
 import json
-from datetime import datetime
+import os
+import queue
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from events import feed
 
 load_dotenv(override=True)
 
-DB = "accounts.db"
+DB = os.getenv("ACCOUNTS_DB", "accounts.db")
 
+# Every thread keeps one long-lived connection; statements are cached per connection
+# so repeated INSERT/SELECTs are only prepared once.
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
+BUSY_TIMEOUT_MS = 30_000
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+]
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return this thread's connection to the database, opening it on first use.
+    The connection is in autocommit mode; use transaction() to group writes.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            DB,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        _local.depth = 0
+        _local.changed = set()
+    return conn
+
+
+def close_connection() -> None:
+    """Close this thread's connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.depth = 0
+        _local.changed = set()
+
+
+@contextmanager
+def transaction():
+    """
+    Group writes into a single transaction that commits once on exit, or rolls back on error.
+    Nested use joins the outermost transaction, so callers can wrap several writes freely.
+    Changes marked with notify() are published to the change feed only once the commit succeeds.
+    """
+    conn = get_connection()
+    depth = _local.depth
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        if depth == 0:
+            _local.changed.clear()
+            conn.execute("ROLLBACK")
+        raise
+    _local.depth = depth
+    if depth == 0:
+        try:
+            conn.execute("COMMIT")
+        except BaseException:
+            # A failed COMMIT (e.g. SQLITE_BUSY) can leave the transaction open; end it so the
+            # thread's next transaction can begin, and drop the changes that never landed
+            _local.changed.clear()
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        changed, _local.changed = _local.changed, set()
+        for topic, key in changed:
+            feed.publish(topic, key)
+
+
+@contextmanager
+def savepoint():
+    """
+    Like transaction(), but if the block fails only its own writes are rolled back; an enclosing
+    transaction keeps everything written before it and can still commit.
+    """
+    with transaction() as conn:
+        conn.execute("SAVEPOINT partial")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO partial")
+            conn.execute("RELEASE partial")
+            raise
+        conn.execute("RELEASE partial")
+
+
+def notify(topic: str, key: str) -> None:
+    """Publish a change to the feed when the current transaction commits."""
+    _local.changed.add((topic, key.lower()))
+
+
+def touch_account(conn: sqlite3.Connection, name: str) -> None:
+    """Bump an account's version so readers in other processes can tell it changed."""
+    conn.execute('UPDATE accounts SET version = version + 1 WHERE name = ?', (name.lower(),))
+    notify("account", name)
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            balance REAL NOT NULL,
+            strategy TEXT NOT NULL DEFAULT '',
+            net_invested REAL NOT NULL DEFAULT 0,
+            realized_pnl REAL NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            cost_basis REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            rationale TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_name_timestamp ON transactions (name, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_name_id ON transactions (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_portfolio_snapshots_name_datetime ON portfolio_snapshots (name, datetime)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_rollups (
+            name TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            value REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (name, resolution, bucket)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -20,82 +187,732 @@ with sqlite3.connect(DB) as conn:
             message TEXT
         )
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
-
-def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_name_id ON logs (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS log_rollups (
+            name TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (name, hour, type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS span_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            label TEXT NOT NULL,
+            server TEXT,
+            duration_ms REAL NOT NULL,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_span_metrics_datetime ON span_metrics (datetime)')
+    conn.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
+    if add_missing_columns(conn):
+        rebuild_account_aggregates(conn)
+    has_rollups = conn.execute('SELECT 1 FROM portfolio_rollups LIMIT 1').fetchone()
+    if not has_rollups and conn.execute('SELECT 1 FROM portfolio_snapshots LIMIT 1').fetchone():
+        rebuild_portfolio_rollups(conn)
+
+
+# Columns added after the normalized tables were first introduced
+ADDED_COLUMNS = {
+    "accounts": {
+        "net_invested": "REAL NOT NULL DEFAULT 0",
+        "realized_pnl": "REAL NOT NULL DEFAULT 0",
+        "version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "holdings": {
+        "cost_basis": "REAL NOT NULL DEFAULT 0",
+    },
+}
+
+
+def add_missing_columns(conn: sqlite3.Connection) -> bool:
+    added = False
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, definition in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                added = True
+    return added
+
+
+def rebuild_account_aggregates(conn: sqlite3.Connection) -> None:
+    """
+    Recompute each account's running totals by replaying its transactions:
+    net_invested is the net cash spent on shares, cost_basis is the average cost of the shares
+    still held, and realized_pnl is the profit locked in by sales against that average cost.
+    """
+    net_invested, realized_pnl, positions = {}, {}, {}
+    rows = conn.execute("SELECT name, symbol, quantity, price FROM transactions ORDER BY id")
+    for name, symbol, quantity, price in rows:
+        net_invested[name] = net_invested.get(name, 0.0) + quantity * price
+        held, cost = positions.get((name, symbol), (0, 0.0))
+        if quantity > 0:
+            held, cost = held + quantity, cost + quantity * price
+        elif held:
+            average = cost / held
+            realized_pnl[name] = realized_pnl.get(name, 0.0) + (price - average) * -quantity
+            held, cost = held + quantity, cost + average * quantity
+        positions[(name, symbol)] = (held, cost if held else 0.0)
+    conn.execute("UPDATE accounts SET net_invested = 0, realized_pnl = 0")
+    conn.executemany(
+        "UPDATE accounts SET net_invested = ?, realized_pnl = ? WHERE name = ?",
+        [(net_invested[name], realized_pnl.get(name, 0.0), name) for name in net_invested],
+    )
+    conn.executemany(
+        "UPDATE holdings SET cost_basis = ? WHERE name = ? AND symbol = ?",
+        [(cost, name, symbol) for (name, symbol), (held, cost) in positions.items()],
+    )
+
+
+# Portfolio values are also kept as the last value in each minute, hour and day, so that
+# old raw snapshots can be pruned while long-range charts still have history to draw
+
+PORTFOLIO_RESOLUTIONS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def rebuild_portfolio_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute every rollup bucket from the raw portfolio snapshots."""
+    conn.execute("DELETE FROM portfolio_rollups")
+    for resolution, bucket_format in PORTFOLIO_RESOLUTIONS.items():
+        # With max(id), SQLite takes the bare value column from the latest snapshot in each bucket
+        conn.execute('''
+            INSERT INTO portfolio_rollups (name, resolution, bucket, value, count)
+            SELECT name, ?, bucket, value, n FROM (
+                SELECT name, strftime(?, datetime) AS bucket, value, count(*) AS n, max(id)
+                FROM portfolio_snapshots
+                GROUP BY name, bucket
+            )
+        ''', (resolution, bucket_format))
+
+
+def migrate_legacy_accounts(conn: sqlite3.Connection) -> int:
+    """
+    Convert an accounts table that holds one JSON blob per account into the normalized tables.
+    Must run inside a transaction so a failure leaves the old table untouched.
+
+    Returns:
+        int: The number of accounts migrated (0 if the schema is already normalized)
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(accounts)")}
+    if "account" not in columns:
+        return 0
+    conn.execute("ALTER TABLE accounts RENAME TO accounts_legacy")
+    create_schema(conn)
+    rows = conn.execute("SELECT name, account FROM accounts_legacy").fetchall()
+    for name, account_json in rows:
+        account = json.loads(account_json)
+        conn.execute(
+            "INSERT INTO accounts (name, balance, strategy) VALUES (?, ?, ?)",
+            (name, account["balance"], account.get("strategy", "")),
+        )
+        conn.executemany(
+            "INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)",
+            [(name, symbol, quantity) for symbol, quantity in account.get("holdings", {}).items() if quantity],
+        )
+        conn.executemany(
+            "INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t.get("rationale", ""))
+                for t in account.get("transactions", [])
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)",
+            [(name, when, value) for when, value in account.get("portfolio_value_time_series", [])],
+        )
+    conn.execute("DROP TABLE accounts_legacy")
+    rebuild_account_aggregates(conn)
+    rebuild_portfolio_rollups(conn)
+    return len(rows)
+
+
+with transaction() as conn:
+    migrate_legacy_accounts(conn)
+    create_schema(conn)
+
+# WAL lets readers (the UI, the MCP servers) proceed while a trader is writing
+get_connection().execute("PRAGMA journal_mode = WAL")
+
+
+def write_account(name: str, balance: float, strategy: str, net_invested: float = 0.0, realized_pnl: float = 0.0) -> None:
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO accounts (name, balance, strategy, net_invested, realized_pnl)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                balance=excluded.balance,
+                strategy=excluded.strategy,
+                net_invested=excluded.net_invested,
+                realized_pnl=excluded.realized_pnl,
+                version=accounts.version + 1
+        ''', (name.lower(), balance, strategy, net_invested, realized_pnl))
+        notify("account", name)
+
+def read_account(name: str) -> dict | None:
+    """
+    Read an account's balance, strategy, running totals and holdings; history is loaded separately.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        'SELECT name, balance, strategy, net_invested, realized_pnl, version FROM accounts WHERE name = ?',
+        (name.lower(),),
+    ).fetchone()
+    if not row:
+        return None
+    holdings = conn.execute('SELECT symbol, quantity, cost_basis FROM holdings WHERE name = ?', (name.lower(),)).fetchall()
+    return {
+        "name": row[0],
+        "balance": row[1],
+        "strategy": row[2],
+        "net_invested": row[3],
+        "realized_pnl": row[4],
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "cost_basis": {symbol: cost_basis for symbol, _, cost_basis in holdings},
+        "version": row[5],
+    }
+
+def read_accounts(names: list[str]) -> dict[str, dict]:
+    """Read several accounts, as read_account does, with one query; accounts that don't exist are left out."""
+    names = [name.lower() for name in names]
+    rows = get_connection().execute(f'''
+        SELECT a.name, a.balance, a.strategy, a.net_invested, a.realized_pnl, a.version, h.symbol, h.quantity, h.cost_basis
+        FROM accounts a LEFT JOIN holdings h ON h.name = a.name
+        WHERE a.name IN ({", ".join("?" * len(names))})
+    ''', names).fetchall()
+    accounts = {}
+    for name, balance, strategy, net_invested, realized_pnl, version, symbol, quantity, cost_basis in rows:
+        account = accounts.setdefault(name, {
+            "name": name,
+            "balance": balance,
+            "strategy": strategy,
+            "net_invested": net_invested,
+            "realized_pnl": realized_pnl,
+            "holdings": {},
+            "cost_basis": {},
+            "version": version,
+        })
+        if symbol is not None:
+            account["holdings"][symbol] = quantity
+            account["cost_basis"][symbol] = cost_basis
+    return accounts
+
+def read_account_version(name: str) -> int | None:
+    """The account's version, which every committed change to it bumps; None if there is no such account."""
+    row = get_connection().execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    return row[0] if row else None
+
+def write_holding(name: str, symbol: str, quantity: int, cost_basis: float = 0.0) -> None:
+    with transaction() as conn:
+        if quantity:
+            conn.execute('''
+                INSERT INTO holdings (name, symbol, quantity, cost_basis)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(name, symbol) DO UPDATE SET quantity=excluded.quantity, cost_basis=excluded.cost_basis
+            ''', (name.lower(), symbol, quantity, cost_basis))
+        else:
+            conn.execute('DELETE FROM holdings WHERE name = ? AND symbol = ?', (name.lower(), symbol))
+        touch_account(conn, name)
+
+def write_transaction(name: str, transaction_dict: dict) -> None:
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            name.lower(),
+            transaction_dict["symbol"],
+            transaction_dict["quantity"],
+            transaction_dict["price"],
+            transaction_dict["timestamp"],
+            transaction_dict["rationale"],
+        ))
+        touch_account(conn, name)
+
+def read_transactions(name: str) -> list[dict]:
+    cursor = get_connection().execute('''
+        SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+        WHERE name = ?
+        ORDER BY id
+    ''', (name.lower(),))
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def read_transactions_page(name: str, limit: int, before_id: int | None = None) -> list[dict]:
+    """
+    Up to limit of an account's transactions, newest first, starting below before_id if given;
+    pass the last row's id as before_id to get the next page.
+    """
+    cursor = get_connection().execute('''
+        SELECT id, symbol, quantity, price, timestamp, rationale FROM transactions
+        WHERE name = ? AND id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), before_id if before_id is not None else 2**63 - 1, limit))
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def write_portfolio_snapshot(name: str, when: str, value: float) -> None:
+    with transaction() as conn:
+        conn.execute(
+            'INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)',
+            (name.lower(), when, value),
+        )
+        conn.executemany('''
+            INSERT INTO portfolio_rollups (name, resolution, bucket, value, count)
+            VALUES (?, ?, strftime(?, ?), ?, 1)
+            ON CONFLICT(name, resolution, bucket) DO UPDATE SET value=excluded.value, count=count + 1
+        ''', [(name.lower(), resolution, bucket_format, when, value) for resolution, bucket_format in PORTFOLIO_RESOLUTIONS.items()])
+        touch_account(conn, name)
+
+def read_portfolio_snapshots(name: str) -> list[tuple[str, float]]:
+    cursor = get_connection().execute(
+        'SELECT datetime, value FROM portfolio_snapshots WHERE name = ? ORDER BY id',
+        (name.lower(),),
+    )
+    return cursor.fetchall()
+
+def read_portfolio_history(name: str) -> list[tuple[str, float]]:
+    """
+    Read an account's portfolio values at the finest resolution still kept for each period:
+    raw snapshots for the most recent, then minute, hour and day buckets going further back.
+
+    Returns:
+        list: A list of (datetime, value) tuples, oldest first
+    """
+    conn = get_connection()
+    history = read_portfolio_snapshots(name)
+    for resolution, bucket_format in PORTFOLIO_RESOLUTIONS.items():
+        start = history[0][0] if history else None
+        older = conn.execute('''
+            SELECT bucket, value FROM portfolio_rollups
+            WHERE name = ? AND resolution = ? AND (? IS NULL OR bucket < strftime(?, ?))
+            ORDER BY bucket
+        ''', (name.lower(), resolution, start, bucket_format, start)).fetchall()
+        history = older + history
+    return history
+
+def reset_account(name: str, balance: float, strategy: str) -> None:
+    """Clear an account's holdings and history and set its balance and strategy."""
+    with transaction() as conn:
+        for table in ("holdings", "transactions", "portfolio_snapshots", "portfolio_rollups"):
+            conn.execute(f'DELETE FROM {table} WHERE name = ?', (name.lower(),))
+        write_account(name, balance, strategy)
+
+def bulk_reset_accounts(accounts: list[dict]) -> None:
+    """
+    Replace whole accounts in one transaction, for seeding and resets. Each account is a dict with name,
+    balance, strategy, net_invested, realized_pnl, holdings {symbol: (quantity, cost_basis)}, transactions
+    [(symbol, quantity, price, timestamp, rationale)] and snapshots [(datetime, value)], oldest first.
+    Anything the accounts held before is cleared, so seeding the same accounts again gives the same result.
+    """
+    names = [(account["name"].lower(),) for account in accounts]
+    with transaction() as conn:
+        for table in ("holdings", "transactions", "portfolio_snapshots", "portfolio_rollups"):
+            conn.executemany(f'DELETE FROM {table} WHERE name = ?', names)
+        conn.executemany('''
+            INSERT INTO accounts (name, balance, strategy, net_invested, realized_pnl)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                balance=excluded.balance,
+                strategy=excluded.strategy,
+                net_invested=excluded.net_invested,
+                realized_pnl=excluded.realized_pnl,
+                version=accounts.version + 1
+        ''', [
+            (account["name"].lower(), account["balance"], account["strategy"], account.get("net_invested", 0.0), account.get("realized_pnl", 0.0))
+            for account in accounts
+        ])
+        conn.executemany(
+            'INSERT INTO holdings (name, symbol, quantity, cost_basis) VALUES (?, ?, ?, ?)',
+            [
+                (account["name"].lower(), symbol, quantity, cost_basis)
+                for account in accounts
+                for symbol, (quantity, cost_basis) in account.get("holdings", {}).items()
+            ],
+        )
+        conn.executemany(
+            'INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)',
+            [(account["name"].lower(), *row) for account in accounts for row in account.get("transactions", [])],
+        )
+        conn.executemany(
+            'INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)',
+            [(account["name"].lower(), *row) for account in accounts for row in account.get("snapshots", [])],
+        )
+        seeded = json.dumps([name for name, in names])
+        for resolution, bucket_format in PORTFOLIO_RESOLUTIONS.items():
+            conn.execute('''
+                INSERT INTO portfolio_rollups (name, resolution, bucket, value, count)
+                SELECT name, ?, bucket, value, n FROM (
+                    SELECT name, strftime(?, datetime) AS bucket, value, count(*) AS n, max(id)
+                    FROM portfolio_snapshots
+                    WHERE name IN (SELECT value FROM json_each(?))
+                    GROUP BY name, bucket
+                )
+            ''', (resolution, bucket_format, seeded))
+        for name, in names:
+            notify("account", name)
+
+# Log rows are buffered in memory and written in batches by a background thread,
+# so tracing never blocks the event loop on a disk write
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "0.5"))
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop").strip().lower()  # "drop" or "block"
+LOG_BLOCK_TIMEOUT_SECONDS = float(os.getenv("LOG_BLOCK_TIMEOUT_SECONDS", "5"))
+
+LOG_INSERT_SQL = 'INSERT INTO logs (name, datetime, type, message) VALUES (?, ?, ?, ?)'
+
+_FLUSH = object()
+_STOP = object()
+
+
+class LogWriter:
+    """
+    A bounded queue of log rows, drained by a daemon thread that inserts them with executemany
+    and publishes the names they belong to under topic on the change feed.
+    A batch is written once it reaches batch_size rows or flush_seconds have passed.
+    When the queue is full, the "drop" policy discards the new row and the "block" policy
+    waits up to LOG_BLOCK_TIMEOUT_SECONDS for space before discarding it; discarded rows are counted.
+    """
+
+    def __init__(self, maxsize=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, flush_seconds=LOG_FLUSH_SECONDS, policy=LOG_QUEUE_POLICY,
+                 insert_sql=LOG_INSERT_SQL, topic="logs"):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown log queue policy {policy}")
+        self.insert_sql = insert_sql
+        self.topic = topic
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.policy = policy
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name=f"{self.topic}-writer", daemon=True)
+                self.thread.start()
+
+    def write(self, row: tuple) -> None:
+        if self.thread is None:
+            self.start()
+        try:
+            if self.policy == "block":
+                self.queue.put(row, timeout=LOG_BLOCK_TIMEOUT_SECONDS)
+            else:
+                self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Block until every row queued so far has been committed."""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def shutdown(self) -> None:
+        """Flush outstanding rows and stop the writer thread."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None or not thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        thread.join()
+        if self.dropped:
+            print(f"Log writer dropped {self.dropped} {self.topic} entries because the queue was full")
+
+    def _next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size and batch[-1] is not _FLUSH and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            rows = [item for item in batch if item is not _FLUSH and item is not _STOP]
+            try:
+                if rows:
+                    with transaction() as conn:
+                        conn.executemany(self.insert_sql, rows)
+                        for name in {row[0] for row in rows}:
+                            notify(self.topic, name)
+            except sqlite3.Error as e:
+                print(f"Log writer failed to write {len(rows)} {self.topic} entries: {e}")
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is _STOP:
+                close_connection()
+                return
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.shutdown)
+
+
 def write_log(name: str, type: str, message: str):
     """
-    Write a log entry to the logs table.
-    
+    Queue a log entry for the logs table; it is written by the background log writer.
+
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO logs (name, datetime, type, message)
-            VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    log_writer.write((name.lower(), now, type, message))
+
+# Structured timings, token counts and costs of trace spans, written in batches like the logs
+
+METRIC_INSERT_SQL = '''
+    INSERT INTO span_metrics (name, datetime, kind, label, server, duration_ms, input_tokens, output_tokens, cost)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+metrics_writer = LogWriter(insert_sql=METRIC_INSERT_SQL, topic="metrics")
+atexit.register(metrics_writer.shutdown)
+
+
+def write_span_metric(name: str, kind: str, label: str, server: str | None, duration_ms: float,
+                      input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0) -> None:
+    """Queue one span's metrics; they are written by a background writer like the logs."""
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    metrics_writer.write((name.lower(), now, kind, label, server, duration_ms, input_tokens, output_tokens, cost))
+
+def read_span_metrics(since: str) -> list[tuple]:
+    """
+    Read span metrics recorded at or after since (UTC, "%Y-%m-%d %H:%M:%S").
+
+    Returns:
+        list: A list of tuples containing (name, kind, label, server, duration_ms, input_tokens, output_tokens, cost)
+    """
+    cursor = get_connection().execute('''
+        SELECT name, kind, label, server, duration_ms, input_tokens, output_tokens, cost FROM span_metrics
+        WHERE datetime >= ?
+    ''', (since,))
+    return cursor.fetchall()
 
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
-    
+
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-        
+
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
+    cursor = get_connection().execute('''
+        SELECT datetime, type, message FROM logs
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n))
+    return reversed(cursor.fetchall())
+
+def read_log_since(name: str, after_id: int = 0, last_n: int = 10) -> list[tuple]:
+    """
+    Read up to last_n of the newest log entries for a name with an id greater than after_id,
+    so a reader that remembers the last id it saw only ever fetches new rows.
+
+    Returns:
+        list: A list of tuples containing (id, datetime, type, message), oldest first
+    """
+    cursor = get_connection().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id > ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), after_id, last_n))
+    return cursor.fetchall()[::-1]
+
+# Raw log rows older than LOG_RETENTION_DAYS are folded into hourly counts per trader and type
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "14"))
+LOG_COMPACT_CHUNK_SIZE = int(os.getenv("LOG_COMPACT_CHUNK_SIZE", "50000"))
+
+
+def compact_logs(retention_days: float = LOG_RETENTION_DAYS, chunk_size: int = LOG_COMPACT_CHUNK_SIZE) -> int:
+    """
+    Roll log rows older than retention_days up into log_rollups and delete them.
+    Rows are taken oldest first in chunks of chunk_size, each in its own short transaction,
+    so the writer lock is never held for long and no full scan is needed to find old rows.
+
+    Returns:
+        int: The number of raw log rows compacted
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    compacted = 0
+    while True:
+        with transaction() as conn:
+            last_id, = conn.execute('''
+                SELECT max(id) FROM (SELECT id, datetime FROM logs ORDER BY id LIMIT ?)
+                WHERE datetime < ?
+            ''', (chunk_size, cutoff)).fetchone()
+            if last_id is None:
+                return compacted
+            conn.execute('''
+                INSERT INTO log_rollups (name, hour, type, count)
+                SELECT name, strftime('%Y-%m-%d %H:00:00', datetime), coalesce(type, ''), count(*)
+                FROM logs WHERE id <= ? AND datetime < ?
+                GROUP BY 1, 2, 3
+                ON CONFLICT(name, hour, type) DO UPDATE SET count = count + excluded.count
+            ''', (last_id, cutoff))
+            deleted = conn.execute('DELETE FROM logs WHERE id <= ? AND datetime < ?', (last_id, cutoff)).rowcount
+        compacted += deleted
+        if deleted < chunk_size:
+            return compacted
+
+def prune_span_metrics(retention_days: float = LOG_RETENTION_DAYS) -> int:
+    """Delete span metrics older than retention_days; returns the number deleted."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as conn:
+        return conn.execute('DELETE FROM span_metrics WHERE datetime < ?', (cutoff,)).rowcount
+
+# Raw portfolio snapshots, and minute and hour buckets, are kept for this many days; day buckets are kept forever
+PORTFOLIO_RETENTION_DAYS = {
+    "raw": float(os.getenv("PORTFOLIO_RAW_RETENTION_DAYS", "2")),
+    "minute": float(os.getenv("PORTFOLIO_MINUTE_RETENTION_DAYS", "14")),
+    "hour": float(os.getenv("PORTFOLIO_HOUR_RETENTION_DAYS", "180")),
+}
+
+
+def compact_portfolio_snapshots(retention_days: dict = PORTFOLIO_RETENTION_DAYS) -> int:
+    """
+    Prune raw snapshots and fine-grained buckets that are past their retention period.
+    Snapshot times are local, like the timestamps Account records.
+
+    Returns:
+        int: The number of rows pruned
+    """
+    now = datetime.now()
+    pruned = 0
+    with transaction() as conn:
+        cutoff = (now - timedelta(days=retention_days["raw"])).strftime("%Y-%m-%d %H:%M:%S")
+        pruned += conn.execute('DELETE FROM portfolio_snapshots WHERE datetime < ?', (cutoff,)).rowcount
+        for resolution in ("minute", "hour"):
+            cutoff = (now - timedelta(days=retention_days[resolution])).strftime("%Y-%m-%d %H:%M:%S")
+            pruned += conn.execute(
+                'DELETE FROM portfolio_rollups WHERE resolution = ? AND bucket < ?', (resolution, cutoff)
+            ).rowcount
+    return pruned
+
+def read_log_rollups(name: str) -> list[tuple]:
+    """
+    Read the hourly log counts kept for a name once its raw logs have aged out.
+
+    Returns:
+        list: A list of tuples containing (hour, type, count), oldest first
+    """
+    cursor = get_connection().execute(
+        'SELECT hour, type, count FROM log_rollups WHERE name = ? ORDER BY hour, type',
+        (name.lower(),),
+    )
+    return cursor.fetchall()
+
+def read_account_versions() -> dict[str, int]:
+    return dict(get_connection().execute('SELECT name, version FROM accounts').fetchall())
+
+
+WATCH_POLL_SECONDS = float(os.getenv("DB_WATCH_POLL_SECONDS", "0.5"))
+
+
+class DatabaseWatcher:
+    """
+    Publishes changes committed by other processes (e.g. the trading floor) to the change feed.
+    A daemon thread polls PRAGMA data_version, which only moves when another connection commits,
+    and only then looks for new log rows, bumped account versions and new span metrics.
+    """
+
+    def __init__(self, poll_seconds=WATCH_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.thread = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self._run, name="db-watcher", daemon=True)
+                self.thread.start()
+
+    def stop(self) -> None:
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stopping.set()
+            thread.join()
+
+    def _run(self) -> None:
+        conn = get_connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        last_log_id = conn.execute("SELECT coalesce(max(id), 0) FROM logs").fetchone()[0]
+        versions = read_account_versions()
+        last_metric_id = conn.execute("SELECT coalesce(max(id), 0) FROM span_metrics").fetchone()[0]
+        while not self.stopping.wait(self.poll_seconds):
+            try:
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current == data_version:
+                    continue
+                data_version = current
+                rows = conn.execute(
+                    "SELECT name, max(id) FROM logs WHERE id > ? GROUP BY name", (last_log_id,)
+                ).fetchall()
+                for name, log_id in rows:
+                    feed.publish("logs", name)
+                    last_log_id = max(last_log_id, log_id)
+                for name, version in read_account_versions().items():
+                    if versions.get(name) != version:
+                        versions[name] = version
+                        feed.publish("account", name)
+                rows = conn.execute(
+                    "SELECT name, max(id) FROM span_metrics WHERE id > ? GROUP BY name", (last_metric_id,)
+                ).fetchall()
+                for name, metric_id in rows:
+                    feed.publish("metrics", name)
+                    last_metric_id = max(last_metric_id, metric_id)
+            except sqlite3.Error as e:
+                print(f"Database watcher failed to poll for changes: {e}")
+        close_connection()
+
+
+database_watcher = DatabaseWatcher()
 
 def write_market(date: str, data: dict) -> None:
     data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with transaction() as conn:
+        conn.execute('''
             INSERT INTO market (date, data)
             VALUES (?, ?)
             ON CONFLICT(date) DO UPDATE SET data=excluded.data
         ''', (date, data_json))
-        conn.commit()
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    cursor = get_connection().execute('SELECT data FROM market WHERE date = ?', (date,))
+    row = cursor.fetchone()
+    return json.loads(row[0]) if row else None
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+
+def lttb(points: list[tuple[str, float]], budget: int) -> list[tuple[str, float]]:
+    """
+    Downsample a time series of (datetime, value) points to at most budget points with
+    Largest-Triangle-Three-Buckets: the first and last points are kept, the rest are split into
+    buckets, and from each bucket the point forming the largest triangle with the previously kept
+    point and the average of the next bucket is kept. Peaks and troughs survive, unlike averaging.
+    """
+    if budget >= len(points) or budget < 3:
+        return list(points)
+    xs = [datetime.fromisoformat(when).timestamp() for when, _ in points]
+    ys = [value for _, value in points]
+    sampled = [points[0]]
+    every = (len(points) - 2) / (budget - 2)
+    a = 0
+    for i in range(budget - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        if end >= next_end:
+            next_x, next_y = xs[-1], ys[-1]
+        else:
+            next_x = sum(xs[end:next_end]) / (next_end - end)
+            next_y = sum(ys[end:next_end]) / (next_end - end)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - next_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (next_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,37 @@
+import threading
+from collections import defaultdict
+from typing import Callable
+
+
+class ChangeFeed:
+    """
+    An in-process pub/sub of data changes. Each (topic, key) pair - e.g. ("logs", "warren") -
+    has a version counter that increases on every publish, so readers can cheaply tell whether
+    anything changed since they last looked, and subscribers are called back on each change.
+    """
+
+    def __init__(self):
+        self.versions: dict[tuple[str, str], int] = defaultdict(int)
+        self.subscribers: list[Callable[[str, str], None]] = []
+        self.lock = threading.Lock()
+
+    def publish(self, topic: str, key: str) -> None:
+        with self.lock:
+            self.versions[(topic, key.lower())] += 1
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            callback(topic, key.lower())
+
+    def version(self, topic: str, key: str) -> int:
+        return self.versions.get((topic, key.lower()), 0)
+
+    def subscribe(self, callback: Callable[[str, str], None]) -> None:
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[str, str], None]) -> None:
+        with self.lock:
+            self.subscribers.remove(callback)
+
+
+feed = ChangeFeed()
@@ -0,0 +1,155 @@
+"""
+Load test for the trading floor UI. N simulated viewers poll every trader the way app.py's timers
+do (logs every 0.5s, the account panels every 2s) while a second process writes logs and trades,
+as the trading floor would. Every SQL statement the viewers issue is counted: with the change feed
+they should only read the database when something changed, and never an account's full history.
+Prices are simulated, and the accounts live in their own database.
+
+Usage: uv run load_app.py [--viewers 20] [--seconds 10] [--history 2000] [--db /tmp/load_app.db]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description="Simulate concurrent viewers of the trading floor UI")
+parser.add_argument("--viewers", type=int, default=20)
+parser.add_argument("--seconds", type=float, default=10.0)
+parser.add_argument("--history", type=int, default=2000, help="Transactions to seed each account with")
+parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "load_app.db"))
+parser.add_argument("--writer", action="store_true", help=argparse.SUPPRESS)
+args = parser.parse_args()
+# Chosen before database.py is imported, which opens the database
+os.environ["ACCOUNTS_DB"] = args.db
+
+import gradio as gr
+import database
+import market
+from accounts import Account
+from app import Trader, TraderView
+from trading_floor import names, lastnames, short_model_names
+
+PRICES = {"AAPL": 200.0, "MSFT": 400.0, "NVDA": 120.0, "KO": 60.0}
+LOG_SECONDS = 0.5
+ACCOUNT_SECONDS = 2.0
+
+
+def seed(history: int) -> None:
+    for name in names:
+        account = Account.get(name)
+        account.reset("")
+        with database.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)",
+                [(name.lower(), "KO", 1, 0.01, "2025-01-01 10:00:00", "seed")] * history,
+            )
+
+
+def write(seconds: float) -> None:
+    """Log a line per trader every 50ms and make a trade roughly every second, as the floor would."""
+    print("ready", flush=True)
+    end, i = time.time() + seconds, 0
+    while time.time() < end:
+        for name in names:
+            database.write_log(name, "agent", f"Thinking {i}")
+        if i % 20 == 0:
+            account = Account.get(names[i // 20 % len(names)])
+            account.buy_shares("AAPL", 1, "load test")
+            account.record_portfolio_value(account.calculate_portfolio_value())
+        i += 1
+        time.sleep(0.05)
+    database.log_writer.flush()
+
+
+class Counter:
+    """Counts the statements run on the viewers' connections."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.full_history_reads = 0
+        self.viewers = set()
+        self.get_connection = database.get_connection
+        database.get_connection = self.connection
+
+    def connection(self):
+        conn = self.get_connection()
+        if threading.get_ident() in self.viewers:
+            conn.set_trace_callback(self.count)
+        return conn
+
+    def count(self, statement: str) -> None:
+        with self.lock:
+            self.queries += 1
+            if "FROM transactions" in statement and "LIMIT" not in statement:
+                self.full_history_reads += 1
+
+
+def view(traders: list[Trader], seconds: float, counter: Counter, stats: dict) -> None:
+    """One browser tab: tick the log and account timers of every trader for seconds."""
+    counter.viewers.add(threading.get_ident())
+    views = [TraderView(trader) for trader in traders]
+    logs = [None] * len(views)
+    seen = [view.trader.get_view()[:2] for view in views]
+    counts = dict.fromkeys(stats, 0)
+    end, next_refresh = time.time() + seconds, 0.0
+    while time.time() < end:
+        for i, trader_view in enumerate(views):
+            html = trader_view.trader.get_logs(logs[i])
+            counts["log_ticks"] += 1
+            if isinstance(html, str):
+                logs[i] = html
+                counts["log_renders"] += 1
+        if time.time() >= next_refresh:
+            next_refresh = time.time() + ACCOUNT_SECONDS
+            for i, trader_view in enumerate(views):
+                seen[i], *outputs = trader_view.refresh(seen[i])
+                counts["account_ticks"] += 1
+                counts["account_renders"] += not all(output == gr.update() for output in outputs)
+        time.sleep(LOG_SECONDS)
+    with counter.lock:
+        for key, count in counts.items():
+            stats[key] += count
+
+
+def main() -> None:
+    seed(args.history)
+    traders = [Trader(name, lastname, model) for name, lastname, model in zip(names, lastnames, short_model_names)]
+    database.database_watcher.start()
+    counter = Counter()
+    stats = {"log_ticks": 0, "log_renders": 0, "account_ticks": 0, "account_renders": 0}
+    command = [sys.executable, os.path.abspath(__file__), "--writer", "--db", args.db, "--seconds", str(args.seconds)]
+    writer = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # Its imports take a while; start watching once it is writing
+    writer.stdout.readline()
+    viewers = [threading.Thread(target=view, args=(traders, args.seconds, counter, stats)) for _ in range(args.viewers)]
+    for viewer in viewers:
+        viewer.start()
+    for viewer in viewers:
+        viewer.join()
+    if writer.wait():
+        sys.exit(f"The writer process failed with exit code {writer.returncode}")
+    print(
+        f"{args.viewers} viewers x {len(traders)} traders for {args.seconds:.0f}s: "
+        f"{stats['log_ticks']} log ticks ({stats['log_renders']} re-rendered), "
+        f"{stats['account_ticks']} account ticks ({stats['account_renders']} re-rendered)"
+    )
+    print(
+        f"Viewer queries: {counter.queries} ({counter.queries / args.seconds:.1f}/s); "
+        f"polling would have run {stats['log_ticks'] + stats['account_ticks']} or more"
+    )
+    print(f"Full transaction history reads: {counter.full_history_reads}")
+    sys.exit(1 if counter.full_history_reads else 0)
+
+
+if __name__ == "__main__":
+    market.simulate(datetime(2025, 6, 2, 10), PRICES)
+    if args.writer:
+        write(args.seconds)
+    else:
+        main()
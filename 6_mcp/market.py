@@ -3,9 +3,11 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime
 import random
-from database import write_market, read_market
+from market_store import market_store, MarketDay
 from functools import lru_cache
 from datetime import timezone
+from price_cache import PriceCache
+from market_calendar import MarketStatus
 
 load_dotenv(override=True)
 
@@ -15,16 +17,66 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+# How long a cached price is good for depends on how fresh the plan's data is:
+# end of day data changes once a day, the paid plan is 15 minutes delayed, realtime is live
 
-def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
+PRICE_CACHE_TTL_SECONDS = {"eod": 3600.0, "paid": 60.0, "realtime": 2.0}
+price_cache_plan = "realtime" if is_realtime_polygon else "paid" if is_paid_polygon else "eod"
+price_cache_ttl = float(os.getenv("PRICE_CACHE_TTL_SECONDS", PRICE_CACHE_TTL_SECONDS[price_cache_plan]))
+price_cache = PriceCache(ttl_seconds=price_cache_ttl, maxsize=int(os.getenv("PRICE_CACHE_MAX_SIZE", "5000")))
+
+
+@lru_cache(maxsize=1)
+def get_client() -> RESTClient:
+    """One shared client per process, so its urllib3 connection pool is reused across calls."""
+    return RESTClient(polygon_api_key, num_pools=4, retries=3)
+
+
+def get_price_cache_stats() -> dict:
+    return price_cache.stats()
+
+
+# The backtester replays stored market days: while a day is simulated, every price lookup is
+# served from that day's prices and now() reports the simulated time instead of the wall clock
+
+simulated_prices: MarketDay | dict[str, float] | None = None
+simulated_now: datetime | None = None
+
+
+def simulate(when: datetime | None, prices: MarketDay | dict[str, float] | None = None) -> None:
+    """Serve prices and the time from a simulated day; simulate(None) goes back to live data."""
+    global simulated_prices, simulated_now
+    simulated_now = when
+    simulated_prices = prices if when else None
+
+
+def now() -> datetime:
+    return simulated_now or datetime.now()
+
+
+def is_market_open_polygon() -> bool:
+    client = get_client()
     market_status = client.get_market_status()
     return market_status.market == "open"
 
 
+# Market status comes from the exchange calendar; set MARKET_STATUS_CONFIRM=true to also confirm it
+# with Polygon once per open/close boundary
+confirm_market_status = os.getenv("MARKET_STATUS_CONFIRM", "false").strip().lower() == "true"
+market_status = MarketStatus(confirm=is_market_open_polygon if polygon_api_key and confirm_market_status else None)
+
+
+def is_market_open() -> bool:
+    return market_status.is_open()
+
+
+def seconds_until_market_opens() -> float:
+    return market_status.seconds_until_open()
+
+
 def get_all_share_prices_polygon_eod() -> dict[str, float]:
     """With much thanks to student Reema R. for fixing the timezone issue with this!"""
-    client = RESTClient(polygon_api_key)
+    client = get_client()
 
     probe = client.get_previous_close_agg("SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
@@ -33,15 +85,30 @@ def get_all_share_prices_polygon_eod() -> dict[str, float]:
     return {result.ticker: result.close for result in results}
 
 
-@lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
+def get_market_for_prior_date(today) -> MarketDay:
+    market_data = market_store.get_day(today)
+    if market_data is None:
+        market_store.write_day(today, get_all_share_prices_polygon_eod())
+        market_data = market_store.get_day(today)
     return market_data
 
 
+def prefetch_market_data() -> int:
+    """
+    Make sure the day's end of day prices are in the market store, downloading them if need be, so
+    the MCP servers' first lookups read the shared file rather than each downloading the whole
+    market. Returns the number of symbols, or 0 where prices aren't end of day Polygon data.
+    """
+    if not polygon_api_key or is_paid_polygon or is_realtime_polygon or simulated_prices is not None:
+        return 0
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    try:
+        return len(get_market_for_prior_date(today))
+    except Exception as e:
+        print(f"Could not prefetch market data: {e}")
+        return 0
+
+
 def get_share_price_polygon_eod(symbol) -> float:
     today = datetime.now().date().strftime("%Y-%m-%d")
     market_data = get_market_for_prior_date(today)
@@ -49,22 +116,66 @@ def get_share_price_polygon_eod(symbol) -> float:
 
 
 def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
+    client = get_client()
     result = client.get_snapshot_ticker("stocks", symbol)
     return result.min.close or result.prev_day.close
 
 
+# The snapshot endpoint takes a comma-separated ticker list; chunk it to keep URLs reasonable
+SNAPSHOT_CHUNK_SIZE = 250
+
+
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    client = get_client()
+    prices = {symbol: 0.0 for symbol in symbols}
+    for start in range(0, len(symbols), SNAPSHOT_CHUNK_SIZE):
+        chunk = symbols[start : start + SNAPSHOT_CHUNK_SIZE]
+        for result in client.get_snapshot_all("stocks", tickers=chunk):
+            latest = result.min.close if result.min else None
+            previous = result.prev_day.close if result.prev_day else None
+            prices[result.ticker] = latest or previous or 0.0
+    return prices
+
+
 def get_share_price_polygon(symbol) -> float:
-    if is_paid_polygon:
-        return get_share_price_polygon_min(symbol)
+    if is_paid_polygon or is_realtime_polygon:
+        return price_cache.get(symbol, get_share_price_polygon_min)
     else:
-        return get_share_price_polygon_eod(symbol)
+        return price_cache.get(symbol, get_share_price_polygon_eod)
 
 
 def get_share_price(symbol) -> float:
+    if simulated_prices is not None:
+        return simulated_prices.get(symbol, 0.0)
     if polygon_api_key:
         try:
             return get_share_price_polygon(symbol)
         except Exception as e:
             print(f"Was not able to use the polygon API due to {e}; using a random number")
     return float(random.randint(1, 100))
+
+
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    market_data = get_market_for_prior_date(today)
+    return {symbol: market_data.get(symbol, 0.0) for symbol in symbols}
+
+
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    if is_paid_polygon or is_realtime_polygon:
+        return price_cache.get_many(symbols, get_share_prices_polygon_min)
+    else:
+        return price_cache.get_many(symbols, get_share_prices_polygon_eod)
+
+
+def get_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Price several symbols with a single lookup where the data source allows it."""
+    symbols = list(dict.fromkeys(symbols))
+    if simulated_prices is not None:
+        return {symbol: simulated_prices.get(symbol, 0.0) for symbol in symbols}
+    if polygon_api_key and symbols:
+        try:
+            return get_share_prices_polygon(symbols)
+        except Exception as e:
+            print(f"Was not able to use the polygon API due to {e}; using random numbers")
+    return {symbol: float(random.randint(1, 100)) for symbol in symbols}
@@ -0,0 +1,158 @@
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Callable
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# The NYSE trading calendar, computed from the exchange's holiday rules so no API call is needed:
+# regular sessions are 9:30 to 16:00 New York time, with 13:00 closes on the usual half days
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+OPEN_TIME = time(9, 30)
+CLOSE_TIME = time(16, 0)
+EARLY_CLOSE_TIME = time(13, 0)
+
+# Unscheduled closures that the rules can't predict; add more with MARKET_EXTRA_HOLIDAYS=YYYY-MM-DD,...
+SPECIAL_CLOSURES = {"2025-01-09"} | {d for d in os.getenv("MARKET_EXTRA_HOLIDAYS", "").split(",") if d}
+
+# How long a live status that contradicts the calendar is trusted before asking again
+MARKET_STATUS_RECHECK_SECONDS = float(os.getenv("MARKET_STATUS_RECHECK_SECONDS", "900"))
+
+
+def easter(year: int) -> date:
+    """Gregorian Easter Sunday (the anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """The nth given weekday (Monday is 0) of a month; n=-1 is the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(holiday: date) -> date:
+    """Saturday holidays are observed on the Friday before, Sunday ones on the Monday after."""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=32)
+def holidays(year: int) -> frozenset[date]:
+    days = {
+        nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        observed(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, 0, 1),  # Labor Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day on a Saturday is not made up on the Friday before, which is in the old year
+    if date(year, 1, 1).weekday() != 5:
+        days.add(observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.add(observed(date(year, 6, 19)))  # Juneteenth
+    days |= {date.fromisoformat(d) for d in SPECIAL_CLOSURES if d.startswith(str(year))}
+    return frozenset(days)
+
+
+@lru_cache(maxsize=32)
+def early_closes(year: int) -> frozenset[date]:
+    days = {nth_weekday(year, 11, 3, 4) + timedelta(days=1)}  # The day after Thanksgiving
+    for eve in (date(year, 7, 3), date(year, 12, 24)):
+        if eve.weekday() < 4:  # Monday to Thursday; on a Friday it is the observed holiday or a full day
+            days.add(eve)
+    return frozenset(days - holidays(year))
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def session(day: date) -> tuple[datetime, datetime] | None:
+    """The open and close of a day's session as aware datetimes, or None if the market is shut all day."""
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE_TIME if day in early_closes(day.year) else CLOSE_TIME
+    return datetime.combine(day, OPEN_TIME, EXCHANGE_TZ), datetime.combine(day, close, EXCHANGE_TZ)
+
+
+def is_open(at: datetime) -> bool:
+    hours = session(at.astimezone(EXCHANGE_TZ).date())
+    return hours is not None and hours[0] <= at < hours[1]
+
+
+def next_open(at: datetime) -> datetime:
+    """The next session open strictly after at."""
+    day = at.astimezone(EXCHANGE_TZ).date()
+    while True:
+        hours = session(day)
+        if hours and hours[0] > at:
+            return hours[0]
+        day += timedelta(days=1)
+
+
+def next_boundary(at: datetime) -> datetime:
+    """The next time the market opens or closes after at."""
+    hours = session(at.astimezone(EXCHANGE_TZ).date())
+    if hours and at < hours[1]:
+        return hours[0] if at < hours[0] else hours[1]
+    return next_open(at)
+
+
+class MarketStatus:
+    """
+    Answers "is the market open?" from the calendar and caches the answer until the next open or
+    close. If a live check is given, it confirms the calendar's answer once per boundary; when the
+    two disagree (an unscheduled closure, say) the live answer wins but is rechecked regularly,
+    and if the live check fails the calendar's answer is used.
+    """
+
+    def __init__(self, confirm: Callable[[], bool] | None = None):
+        self.confirm = confirm
+        self.status = None
+        self.expires = None
+
+    def is_open(self) -> bool:
+        now = datetime.now(EXCHANGE_TZ)
+        if self.expires is None or now >= self.expires:
+            self.status = is_open(now)
+            self.expires = next_boundary(now)
+            if self.confirm:
+                try:
+                    live = self.confirm()
+                except Exception as e:
+                    print(f"Could not confirm the market status ({e}); using the exchange calendar")
+                else:
+                    if live != self.status:
+                        print(f"Live market status ({'open' if live else 'closed'}) disagrees with the calendar")
+                        self.status = live
+                        self.expires = min(self.expires, now + timedelta(seconds=MARKET_STATUS_RECHECK_SECONDS))
+        return self.status
+
+    def seconds_until_open(self) -> float:
+        """Seconds until the market next opens; 0 if it is open now."""
+        if self.is_open():
+            return 0.0
+        now = datetime.now(EXCHANGE_TZ)
+        # When a live check has overridden the calendar, wait no longer than the next recheck
+        return max(0.0, (min(next_open(now), self.expires) - now).total_seconds())
@@ -1,5 +1,5 @@
 from mcp.server.fastmcp import FastMCP
-from market import get_share_price
+from market import get_share_price, get_share_prices
 
 mcp = FastMCP("market_server")
 
@@ -12,5 +12,15 @@ async def lookup_share_price(symbol: str) -> float:
     """
     return get_share_price(symbol)
 
+@mcp.tool()
+async def lookup_share_prices(symbols: list[str]) -> dict[str, float]:
+    """This tool provides the current prices of several stock symbols in one call.
+    Prefer it over repeated single lookups when checking more than one stock.
+
+    Args:
+        symbols: the symbols of the stocks
+    """
+    return get_share_prices(symbols)
+
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
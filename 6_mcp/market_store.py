@@ -0,0 +1,153 @@
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# End of day prices are stored as one binary file per date, memory-mapped read-only so that lookups
+# need no parsing and every process reading the same day shares the same pages of the OS cache.
+#
+# File layout (little-endian):
+#   header   magic b"MKT1", symbol count n (uint32), symbol width w (uint16)
+#   symbols  n sorted ASCII symbols, each NUL-padded to w bytes
+#   prices   n float64 closes, in the same order as the symbols
+
+MARKET_STORE_DIR = os.getenv("MARKET_STORE_DIR", "market_data")
+MARKET_STORE_OPEN_DAYS = int(os.getenv("MARKET_STORE_OPEN_DAYS", "8"))
+
+MAGIC = b"MKT1"
+HEADER = struct.Struct("<4sIH")
+
+
+class MarketDay:
+    """One day's prices, looked up by binary search over the memory-mapped symbol block."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.width = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a market data file")
+        self.symbols_offset = HEADER.size
+        self.prices_offset = self.symbols_offset + self.count * self.width
+
+    def symbol_at(self, i: int) -> bytes:
+        start = self.symbols_offset + i * self.width
+        return self.mm[start : start + self.width].rstrip(b"\0")
+
+    def price_at(self, i: int) -> float:
+        return struct.unpack_from("<d", self.mm, self.prices_offset + 8 * i)[0]
+
+    def index(self, symbol: str) -> int:
+        key = symbol.encode("ascii", "ignore")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.symbol_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self.symbol_at(lo) == key else -1
+
+    def get(self, symbol: str, default: float | None = None) -> float | None:
+        i = self.index(symbol)
+        return self.price_at(i) if i >= 0 else default
+
+    def __getitem__(self, symbol: str) -> float:
+        i = self.index(symbol)
+        if i < 0:
+            raise KeyError(symbol)
+        return self.price_at(i)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.index(symbol) >= 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self):
+        for i in range(self.count):
+            yield self.symbol_at(i).decode("ascii"), self.price_at(i)
+
+    def close(self) -> None:
+        self.mm.close()
+
+
+class MarketStore:
+    """A directory of per-day market files, with the most recently used days kept open."""
+
+    def __init__(self, directory: str = MARKET_STORE_DIR, open_days: int = MARKET_STORE_OPEN_DAYS):
+        self.directory = directory
+        self.open_days = open_days
+        self.days: OrderedDict[str, MarketDay] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def path(self, date: str) -> str:
+        return os.path.join(self.directory, f"{date}.bin")
+
+    def has_day(self, date: str) -> bool:
+        return date in self.days or os.path.exists(self.path(date))
+
+    def dates(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith(".bin"))
+
+    def get_day(self, date: str) -> MarketDay | None:
+        with self.lock:
+            day = self.days.get(date)
+            if day is not None:
+                self.days.move_to_end(date)
+                return day
+            if not os.path.exists(self.path(date)):
+                return None
+            day = self.days[date] = MarketDay(self.path(date))
+            # Evicted days are not closed; a reader may still hold them, and the mapping goes with the object
+            while len(self.days) > self.open_days:
+                self.days.popitem(last=False)
+            return day
+
+    def write_day(self, date: str, prices: dict[str, float]) -> None:
+        """Write a day's prices; the file is replaced atomically so readers never see a partial one."""
+        encoded = sorted(
+            (symbol.encode("ascii"), float(price or 0.0)) for symbol, price in prices.items() if symbol.isascii()
+        )
+        width = max((len(symbol) for symbol, _ in encoded), default=1)
+        os.makedirs(self.directory, exist_ok=True)
+        temp = f"{self.path(date)}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(encoded), width))
+            f.write(b"".join(symbol.ljust(width, b"\0") for symbol, _ in encoded))
+            f.write(struct.pack(f"<{len(encoded)}d", *(price for _, price in encoded)))
+        os.replace(temp, self.path(date))
+        with self.lock:
+            self.days.pop(date, None)
+
+
+market_store = MarketStore()
+
+
+def import_market_rows(db_path: str, store: MarketStore = market_store) -> int:
+    """Copy every row of a database's JSON market table into the store; returns the number of days imported."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        imported = 0
+        for date, data in conn.execute("SELECT date, data FROM market ORDER BY date"):
+            store.write_day(date, json.loads(data))
+            imported += 1
+        return imported
+    finally:
+        conn.close()
+
+
+# Usage: uv run market_store.py [path/to/accounts.db ...]  (defaults to this directory's accounts.db)
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or ["accounts.db"]:
+        print(f"{path}: imported {import_market_rows(path)} market days into {market_store.directory}")
@@ -0,0 +1,143 @@
+import argparse
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from database import read_span_metrics
+
+load_dotenv(override=True)
+
+# USD per million input and output tokens; the longest matching prefix of the model name is used.
+# Add or override models with MODEL_PRICES='{"model-prefix": [input, output]}'
+
+MODEL_PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "deepseek-chat": (0.27, 1.10),
+    "gemini-2.5-flash": (0.15, 0.60),
+    "grok-3-mini": (0.30, 0.50),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def cost_of(model: str | None, input_tokens: int, output_tokens: int) -> float:
+    model = (model or "").split("/")[-1]
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    if not matches:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Linear interpolation between the closest ranks of an already sorted list."""
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(hours: float = 24) -> list[dict]:
+    """
+    Aggregate the last hours of span metrics per trader, span kind and label (the model, tool or
+    MCP server), with latency percentiles, token totals and cost.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+    groups = {}
+    for name, kind, label, server, duration_ms, input_tokens, output_tokens, cost in read_span_metrics(since):
+        group = groups.setdefault((name, kind, label, server or ""), {"durations": [], "input": 0, "output": 0, "cost": 0.0})
+        group["durations"].append(duration_ms)
+        group["input"] += input_tokens
+        group["output"] += output_tokens
+        group["cost"] += cost
+    summary = []
+    for (name, kind, label, server), group in sorted(groups.items()):
+        durations = sorted(group["durations"])
+        row = {"trader": name, "kind": kind, "label": label, "server": server, "count": len(durations)}
+        row.update({f"p{round(q * 100)}_ms": round(percentile(durations, q), 1) for q in QUANTILES})
+        row.update({
+            "total_ms": round(sum(durations), 1),
+            "input_tokens": group["input"],
+            "output_tokens": group["output"],
+            "cost": round(group["cost"], 6),
+        })
+        summary.append(row)
+    return summary
+
+
+def to_csv(summary: list[dict]) -> str:
+    output = io.StringIO()
+    if summary:
+        writer = csv.DictWriter(output, fieldnames=list(summary[0]))
+        writer.writeheader()
+        writer.writerows(summary)
+    return output.getvalue()
+
+
+def to_prometheus(summary: list[dict], hours: float = 24) -> str:
+    """
+    Render the summary in the Prometheus text exposition format. Every figure covers only the last
+    hours, so it falls as old spans leave the window; they are exported as gauges, not counters or
+    a summary, whose totals Prometheus expects never to go down.
+    """
+
+    def labels(row: dict, **extra) -> str:
+        pairs = {key: row[key] for key in ("trader", "kind", "label", "server")} | extra
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in pairs.values())
+        return "{" + ",".join(f'{key}="{value}"' for key, value in zip(pairs, escaped)) + "}"
+
+    window = f"over the last {hours:g} hours"
+    lines = [
+        f"# HELP trader_span_duration_seconds Quantiles of trace span durations by trader, kind and label, {window}",
+        "# TYPE trader_span_duration_seconds gauge",
+    ]
+    for row in summary:
+        for q in QUANTILES:
+            lines.append(f"trader_span_duration_seconds{labels(row, quantile=q)} {row[f'p{round(q * 100)}_ms'] / 1000:.6f}")
+    lines += [
+        f"# HELP trader_window_span_seconds Time spent in trace spans by trader, kind and label, {window}",
+        "# TYPE trader_window_span_seconds gauge",
+    ]
+    for row in summary:
+        lines.append(f"trader_window_span_seconds{labels(row)} {row['total_ms'] / 1000:.6f}")
+    lines += [
+        f"# HELP trader_window_spans Trace spans by trader, kind and label, {window}",
+        "# TYPE trader_window_spans gauge",
+    ]
+    for row in summary:
+        lines.append(f"trader_window_spans{labels(row)} {row['count']}")
+    lines += [
+        f"# HELP trader_window_tokens Model tokens used by trader and model, {window}",
+        "# TYPE trader_window_tokens gauge",
+    ]
+    for row in summary:
+        if row["input_tokens"] or row["output_tokens"]:
+            lines.append(f"trader_window_tokens{labels(row, direction='input')} {row['input_tokens']}")
+            lines.append(f"trader_window_tokens{labels(row, direction='output')} {row['output_tokens']}")
+    lines += [
+        f"# HELP trader_window_cost_dollars Estimated model cost by trader and model, {window}",
+        "# TYPE trader_window_cost_dollars gauge",
+    ]
+    for row in summary:
+        if row["cost"]:
+            lines.append(f"trader_window_cost_dollars{labels(row)} {row['cost']:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+# Usage: uv run metrics.py [--hours 24] [--format csv|prometheus]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-trader span metrics")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--format", choices=["csv", "prometheus"], default="csv")
+    args = parser.parse_args()
+    summary = summarize(args.hours)
+    print(to_csv(summary) if args.format == "csv" else to_prometheus(summary, args.hours), end="")
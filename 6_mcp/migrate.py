@@ -0,0 +1,30 @@
+import sys
+import sqlite3
+from database import DB, create_schema, migrate_legacy_accounts
+
+# Converts accounts databases from one JSON blob per account to the normalized tables.
+# Usage: uv run migrate.py [path/to/accounts.db ...]  (defaults to this directory's accounts.db)
+
+
+def migrate(path: str) -> int:
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = migrate_legacy_accounts(conn)
+            create_schema(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if count:
+            conn.execute("VACUUM")
+        return count
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or [DB]:
+        count = migrate(path)
+        print(f"{path}: migrated {count} accounts" if count else f"{path}: already up to date")
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+
+class PriceCache:
+    """
+    A thread-safe TTL cache of share prices with bounded LRU eviction.
+    Concurrent misses for the same symbol are coalesced: one caller fetches upstream
+    and the others wait for its result (single-flight).
+    """
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.inflight: dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+
+    def _lookup(self, symbol: str, now: float) -> float | None:
+        entry = self.entries.get(symbol)
+        if entry is None:
+            return None
+        expires, price = entry
+        if expires <= now:
+            del self.entries[symbol]
+            return None
+        self.entries.move_to_end(symbol)
+        return price
+
+    def _store(self, prices: dict[str, float]) -> None:
+        expires = time.monotonic() + self.ttl_seconds
+        for symbol, price in prices.items():
+            self.entries[symbol] = (expires, price)
+            self.entries.move_to_end(symbol)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, symbols: list[str], fetch_many: Callable[[list[str]], dict[str, float]]) -> dict[str, float]:
+        """
+        Return prices for symbols, calling fetch_many once for whichever are neither cached nor
+        already being fetched by another thread.
+        """
+        prices, waiting, claimed = {}, {}, []
+        with self.lock:
+            now = time.monotonic()
+            for symbol in symbols:
+                price = self._lookup(symbol, now)
+                if price is not None:
+                    self.hits += 1
+                    prices[symbol] = price
+                elif symbol in self.inflight:
+                    self.coalesced += 1
+                    waiting[symbol] = self.inflight[symbol]
+                else:
+                    self.misses += 1
+                    self.inflight[symbol] = Future()
+                    claimed.append(symbol)
+
+        if claimed:
+            start = time.perf_counter()
+            try:
+                fetched = fetch_many(claimed)
+            except BaseException as e:
+                with self.lock:
+                    for symbol in claimed:
+                        self.inflight.pop(symbol).set_exception(e)
+                raise
+            with self.lock:
+                self.fetches += 1
+                self.fetch_seconds += time.perf_counter() - start
+                self._store(fetched)
+                for symbol in claimed:
+                    self.inflight.pop(symbol).set_result(fetched.get(symbol, 0.0))
+            prices.update({symbol: fetched.get(symbol, 0.0) for symbol in claimed})
+
+        for symbol, future in waiting.items():
+            prices[symbol] = future.result()
+        return {symbol: prices[symbol] for symbol in symbols}
+
+    def get(self, symbol: str, fetch: Callable[[str], float]) -> float:
+        return self.get_many([symbol], lambda symbols: {symbols[0]: fetch(symbols[0])})[symbol]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "upstream_fetches": self.fetches,
+                "avg_fetch_ms": 1000 * self.fetch_seconds / self.fetches if self.fetches else 0.0,
+            }
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# Default LLM requests per minute for each provider; override with e.g. RATE_LIMIT_GEMINI_PER_MINUTE=30
+
+DEFAULT_REQUESTS_PER_MINUTE = {
+    "openai": 500,
+    "openrouter": 60,
+    "deepseek": 60,
+    "gemini": 15,
+    "grok": 60,
+}
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket: refills at rate_per_minute, holds at most burst tokens,
+    and makes acquire() wait until a token is available.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: float | None = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+buckets: dict[str, TokenBucket] = {}
+
+
+def bucket_for(provider: str) -> TokenBucket:
+    if provider not in buckets:
+        default = DEFAULT_REQUESTS_PER_MINUTE.get(provider, 60)
+        rate = float(os.getenv(f"RATE_LIMIT_{provider.upper()}_PER_MINUTE", default))
+        buckets[provider] = TokenBucket(rate)
+    return buckets[provider]
@@ -1,4 +1,4 @@
-from accounts import Account
+from seed import expand_traders, seed_traders
 
 waren_strategy = """
 You are Warren, and you are named in homage to your role model, Warren Buffett.
@@ -40,10 +40,15 @@ You focus your trading on crypto ETFs.
 
 
 def reset_traders():
-    Account.get("Warren").reset(waren_strategy)
-    Account.get("George").reset(george_strategy)
-    Account.get("Ray").reset(ray_strategy)
-    Account.get("Cathie").reset(cathie_strategy)
+    spec = {
+        "traders": [
+            {"name": "Warren", "strategy": waren_strategy},
+            {"name": "George", "strategy": george_strategy},
+            {"name": "Ray", "strategy": ray_strategy},
+            {"name": "Cathie", "strategy": cathie_strategy},
+        ]
+    }
+    seed_traders(expand_traders(spec), workers=1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+"""
+Seed or reset many trader accounts at once from a JSON or YAML spec, in a single transaction.
+
+Each entry in "traders" is either one named trader or a numbered batch generated from a prefix, and
+can give a strategy, starting balance and a number of synthetic transactions to generate; anything
+left out comes from "defaults". {name} in a strategy is replaced by the trader's name.
+
+    {
+      "defaults": {"balance": 10000, "transactions": 0, "start": "2025-01-02", "seed": 1},
+      "traders": [
+        {"name": "Warren", "strategy": "You are Warren, a value investor."},
+        {"prefix": "load", "count": 500, "transactions": 2000, "strategy": "You are {name}, a momentum trader."}
+      ]
+    }
+
+Histories trade a daily random walk of prices within each account's cash and holdings, are generated
+in parallel worker processes, and are the same for the same seed; seeding again replaces the accounts
+rather than adding to them. Other accounts in the database are left alone.
+
+Usage: uv run seed.py spec.json [--workers 8]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from accounts import INITIAL_BALANCE, SPREAD
+from database import bulk_reset_accounts
+
+SEED_SYMBOLS = os.getenv(
+    "SEED_SYMBOLS",
+    "AAPL,MSFT,NVDA,AMZN,GOOGL,META,TSLA,JPM,V,XOM,JNJ,WMT,PG,KO,SPY,QQQ,IBIT,ARKK",
+).split(",")
+
+DEFAULTS = {
+    "balance": INITIAL_BALANCE,
+    "strategy": "",
+    "transactions": 0,
+    "symbols": SEED_SYMBOLS,
+    "start": "2025-01-02",
+    "seed": 0,
+}
+
+RATIONALES = [
+    "Strong earnings momentum",
+    "Valuation looks attractive after the pullback",
+    "Trimming to lock in gains",
+    "Rebalancing toward target weights",
+    "Macro outlook has shifted",
+    "Cutting losses on a broken thesis",
+]
+
+
+def load_spec(path: str) -> dict:
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def expand_traders(spec: dict) -> list[dict]:
+    """One dict of settings per trader, with the defaults filled in and batches expanded into names."""
+    defaults = DEFAULTS | spec.get("defaults", {})
+    traders = []
+    for entry in spec["traders"]:
+        entry = defaults | entry
+        if "name" in entry:
+            names = [entry["name"]]
+        else:
+            width = len(str(entry["count"]))
+            names = [f"{entry['prefix']}{i:0{width}d}" for i in range(1, entry["count"] + 1)]
+        for name in names:
+            traders.append(entry | {"name": name, "strategy": entry["strategy"].replace("{name}", name)})
+    return traders
+
+
+def next_trade_time(when: datetime, rng: random.Random) -> datetime:
+    """Some minutes later, rolling over to the next weekday's open after 4pm."""
+    when += timedelta(minutes=rng.randint(1, 90))
+    if when.hour >= 16:
+        when = (when + timedelta(days=1)).replace(hour=9, minute=30)
+        while when.weekday() >= 5:
+            when += timedelta(days=1)
+    return when
+
+
+def synthetic_account(trader: dict) -> dict:
+    """
+    Build an account for bulk_reset_accounts by trading a random walk, keeping the running totals the
+    same way Account.apply_to_aggregates does.
+    """
+    name = trader["name"].lower()
+    rng = random.Random(f"{trader['seed']}:{name}")
+    symbols = trader["symbols"]
+    prices = {symbol: rng.uniform(20, 500) for symbol in symbols}
+    cash = float(trader["balance"])
+    holdings, cost_basis = {}, {}
+    net_invested = realized_pnl = 0.0
+    transactions, snapshots = [], []
+    when = datetime.strptime(trader["start"], "%Y-%m-%d").replace(hour=9, minute=30)
+    while len(transactions) < trader["transactions"]:
+        day = when.date()
+        when = next_trade_time(when, rng)
+        if when.date() != day:
+            for symbol in symbols:
+                prices[symbol] *= math.exp(rng.gauss(0, 0.015))
+        symbol = rng.choice(symbols)
+        buy_price = prices[symbol] * (1 + SPREAD)
+        affordable = int(cash * 0.2 // buy_price)
+        if holdings and (rng.random() < 0.4 or not affordable):
+            symbol = rng.choice(sorted(holdings))
+            held = holdings[symbol]
+            quantity = rng.randint(1, held)
+            price = prices[symbol] * (1 - SPREAD)
+            average_cost = cost_basis[symbol] / held
+            realized_pnl += (price - average_cost) * quantity
+            cost_basis[symbol] -= average_cost * quantity
+            holdings[symbol] = held - quantity
+            if not holdings[symbol]:
+                del holdings[symbol], cost_basis[symbol]
+            quantity = -quantity
+        elif affordable:
+            quantity = rng.randint(1, affordable)
+            price = buy_price
+            holdings[symbol] = holdings.get(symbol, 0) + quantity
+            cost_basis[symbol] = cost_basis.get(symbol, 0.0) + price * quantity
+        else:
+            break
+        cash -= price * quantity
+        net_invested += price * quantity
+        timestamp = when.strftime("%Y-%m-%d %H:%M:%S")
+        transactions.append((symbol, quantity, price, timestamp, rng.choice(RATIONALES)))
+        snapshots.append((timestamp, cash + sum(prices[s] * q for s, q in holdings.items())))
+    return {
+        "name": name,
+        "balance": cash,
+        "strategy": trader["strategy"],
+        "net_invested": net_invested,
+        "realized_pnl": realized_pnl,
+        "holdings": {symbol: (quantity, cost_basis[symbol]) for symbol, quantity in holdings.items()},
+        "transactions": transactions,
+        "snapshots": snapshots,
+    }
+
+
+def seed_traders(traders: list[dict], workers: int | None = None) -> list[dict]:
+    """Generate every account, in parallel worker processes if there is more than one, then write them all in one transaction."""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(traders) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            accounts = list(pool.map(synthetic_account, traders, chunksize=max(1, len(traders) // (workers * 4))))
+    else:
+        accounts = [synthetic_account(trader) for trader in traders]
+    bulk_reset_accounts(accounts)
+    return accounts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed or reset trader accounts from a JSON or YAML spec")
+    parser.add_argument("spec", help="Path to the .json, .yaml or .yml spec")
+    parser.add_argument("--workers", type=int, default=None, help="Processes generating histories (default: one per CPU)")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    accounts = seed_traders(expand_traders(load_spec(args.spec)), args.workers)
+    rows = sum(len(account["transactions"]) for account in accounts)
+    print(f"Seeded {len(accounts)} accounts with {rows} transactions in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,143 @@
+"""
+Stress test for the account service's group commit. Random buys and sells run concurrently over a
+few accounts in this process while a second process trades the same accounts, then every account is
+checked against a replay of its transactions: cash, holdings, net invested and realized P&L must all
+match, and nothing may go negative. Prices are simulated, and the accounts live in their own database.
+
+Usage: uv run stress_accounts.py [--ops 1000] [--db /tmp/stress_accounts.db]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description="Stress the account service with concurrent trades")
+parser.add_argument("--ops", type=int, default=1000, help="Trades from this process; the second process makes half as many")
+parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "stress_accounts.db"))
+parser.add_argument("--seed", type=int, default=1)
+parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    # Chosen before database.py is imported, which opens the database
+    os.environ["ACCOUNTS_DB"] = args.db
+
+import market
+from accounts import Account, INITIAL_BALANCE
+from account_service import AccountService
+from database import DB, get_connection, log_writer
+
+PRICES = {"AAPL": 200.0, "MSFT": 400.0, "NVDA": 120.0, "KO": 60.0, "SPY": 550.0}
+NAMES = ["stress_warren", "stress_george", "stress_ray", "stress_cathie"]
+
+
+def random_trades(seed: int, count: int) -> list[tuple[str, str, str, int]]:
+    rng = random.Random(seed)
+    return [
+        (rng.choice(NAMES), rng.choice(["buy", "buy", "sell"]), rng.choice(list(PRICES)), rng.randint(1, 8))
+        for _ in range(count)
+    ]
+
+
+async def trade(service: AccountService, seed: int, count: int) -> int:
+    """Run the trades concurrently; returns how many succeeded."""
+
+    async def one(name, kind, symbol, quantity):
+        try:
+            if kind == "buy":
+                await service.buy_shares(name, symbol, quantity, "stress")
+            else:
+                await service.sell_shares(name, symbol, quantity, "stress")
+            return 1
+        except ValueError:
+            return 0
+
+    return sum(await asyncio.gather(*(one(*t) for t in random_trades(seed, count))))
+
+
+def check() -> tuple[int, list[str]]:
+    """The number of transactions, and every way an account disagrees with a replay of them."""
+    conn = get_connection()
+    problems = []
+    for name in NAMES:
+        balance, net_invested, realized_pnl = conn.execute(
+            "SELECT balance, net_invested, realized_pnl FROM accounts WHERE name = ?", (name,)
+        ).fetchone()
+        rows = conn.execute("SELECT symbol, quantity, price FROM transactions WHERE name = ? ORDER BY id", (name,)).fetchall()
+        spent = sum(quantity * price for _, quantity, price in rows)
+        positions, realized = {}, 0.0
+        for symbol, quantity, price in rows:
+            held, cost = positions.get(symbol, (0, 0.0))
+            if quantity > 0:
+                held, cost = held + quantity, cost + quantity * price
+            else:
+                average_cost = cost / held if held else price
+                realized += (price - average_cost) * -quantity
+                held, cost = held + quantity, cost + average_cost * quantity
+            if held < 0:
+                problems.append(f"{name}: oversold {symbol}")
+            positions[symbol] = (held, cost if held else 0.0)
+        holdings = dict(conn.execute("SELECT symbol, quantity FROM holdings WHERE name = ?", (name,)).fetchall())
+        if abs(balance - (INITIAL_BALANCE - spent)) > 1e-6:
+            problems.append(f"{name}: balance {balance:.2f}, transactions say {INITIAL_BALANCE - spent:.2f}")
+        if balance < -1e-9:
+            problems.append(f"{name}: negative cash {balance:.2f}")
+        if {symbol: held for symbol, (held, _) in positions.items() if held} != holdings:
+            problems.append(f"{name}: holdings {holdings} don't match the transactions")
+        if abs(net_invested - spent) > 1e-6 or abs(realized_pnl - realized) > 1e-6:
+            problems.append(f"{name}: net invested or realized P&L doesn't match a replay")
+    count = conn.execute(
+        f"SELECT COUNT(*) FROM transactions WHERE name IN ({','.join('?' * len(NAMES))})", NAMES
+    ).fetchone()[0]
+    return count, problems
+
+
+async def stress(count: int, seed: int = 1, other_process: bool = True) -> dict:
+    """Reset the accounts, trade them from here and (optionally) another process, and check them."""
+    for name in NAMES:
+        Account.get(name).reset("")
+    child = None
+    if other_process:
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--db", DB, "--ops", str(count // 2), "--seed", str(seed + 1000)]
+        child = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    service = AccountService()
+    started = time.perf_counter()
+    succeeded = await trade(service, seed, count)
+    elapsed = time.perf_counter() - started
+    if child:
+        output, _ = child.communicate()
+        if child.returncode:
+            raise RuntimeError(f"The second process failed with exit code {child.returncode}")
+        succeeded += int(output.strip().splitlines()[-1])
+    log_writer.flush()
+    transactions, problems = check()
+    if transactions != succeeded:
+        problems.append(f"{transactions} transactions recorded for {succeeded} successful trades")
+    return {
+        "trades": count + (count // 2 if other_process else 0),
+        "succeeded": succeeded,
+        "mutations": service.mutations,
+        "commits": service.commits,
+        "seconds": round(elapsed, 2),
+        "problems": problems,
+    }
+
+
+if __name__ == "__main__":
+    market.simulate(datetime(2025, 6, 2, 10), PRICES)
+    if args.child:
+        print(asyncio.run(trade(AccountService(), args.seed, args.ops)))
+    else:
+        result = asyncio.run(stress(args.ops, args.seed))
+        print(
+            f"{result['trades']} trades ({result['succeeded']} succeeded); this process made {result['mutations']} "
+            f"mutations in {result['commits']} commits, {result['seconds']}s"
+        )
+        print("\n".join(result["problems"]) or "All accounts match their transactions")
+        sys.exit(1 if result["problems"] else 0)
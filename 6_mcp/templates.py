@@ -1,12 +1,11 @@
-from datetime import datetime
-from market import is_paid_polygon, is_realtime_polygon
+from market import is_paid_polygon, is_realtime_polygon, now
 
 if is_realtime_polygon:
     note = "You have access to realtime market data tools; use your get_last_trade tool for the latest trade price. You can also use tools for share information, trends and technical indicators and fundamentals."
 elif is_paid_polygon:
     note = "You have access to market data tools but without access to the trade or quote tools; use your get_snapshot_ticker tool to get the latest share price on a 15 min delay. You can also use tools for share information, trends and technical indicators and fundamentals."
 else:
-    note = "You have access to end of day market data; use you get_share_price tool to get the share price as of the prior close."
+    note = "You have access to end of day market data; use you get_share_price tool to get the share price as of the prior close, or your lookup_share_prices tool to price several stocks in one call."
 
 
 def researcher_instructions():
@@ -24,7 +23,7 @@ Also use it to store web addresses that you find interesting so you can check th
 Draw on your knowledge graph to build your expertise over time.
 
 If there isn't a specific request, then just respond with investment opportunities based on searching latest news.
-The current datetime is {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+The current datetime is {now().strftime("%Y-%m-%d %H:%M:%S")}
 """
 
 def research_tool():
@@ -61,7 +60,7 @@ Your investment strategy:
 Here is your current account:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
 respond with a brief 2-3 sentence appraisal of your portfolio and its outlook.
@@ -80,7 +79,7 @@ You also have a tool to change your strategy if you wish; you can decide at any
 Here is your current account:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
 respond with a brief 2-3 sentence appraisal of your portfolio and its outlook."""
\ No newline at end of file
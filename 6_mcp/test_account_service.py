@@ -0,0 +1,108 @@
+"""
+Checks the account service's group commit: cancelling a caller doesn't strand the rest of its group,
+and concurrent trades from two processes leave every account consistent with its transactions. Also
+checks that reading an account's report, which clients retry, changes nothing.
+
+The database is a throwaway one set up by conftest.py.
+
+Usage: uv run pytest test_account_service.py
+"""
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import market
+from accounts import Account
+from account_service import AccountService
+from accounts_server import read_account_resource
+from database import read_account_version, read_portfolio_history
+from stress_accounts import PRICES, stress
+
+
+@contextmanager
+def simulated_market():
+    market.simulate(datetime(2025, 6, 2, 10), PRICES)
+    try:
+        yield
+    finally:
+        market.simulate(None)
+
+
+def slow_service(delay: float) -> AccountService:
+    """A service whose commits take at least delay seconds, so callers can be cancelled mid-commit."""
+    service = AccountService()
+    apply = service.apply
+
+    def slow_apply(name, group):
+        time.sleep(delay)
+        return apply(name, group)
+
+    service.apply = slow_apply
+    return service
+
+
+def test_cancelled_caller_does_not_strand_its_group():
+    async def run():
+        Account.get("cancel_test").reset("")
+        service = slow_service(0.3)
+        first = asyncio.create_task(service.buy_shares("cancel_test", "AAPL", 1, "first"))
+        await asyncio.sleep(0.1)
+        # These queue up while the first commit is in flight, and are then committed as one group
+        caller = asyncio.create_task(service.buy_shares("cancel_test", "MSFT", 1, "caller"))
+        others = [asyncio.create_task(service.buy_shares("cancel_test", "KO", 1, f"other {i}")) for i in range(2)]
+        await first
+        await asyncio.sleep(0.1)
+        # Cancel the caller that was first in the group while that group is being committed
+        caller.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*others), 5)
+        assert all(result.startswith("Completed") for result in results)
+        # The cancelled trade was already being committed with the others, so it still goes through
+        assert service.get("cancel_test").holdings == {"AAPL": 1, "MSFT": 1, "KO": 2}
+
+    with simulated_market():
+        asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_break_the_group():
+    async def run():
+        Account.get("cancel_waiter").reset("")
+        service = slow_service(0.3)
+        first = asyncio.create_task(service.buy_shares("cancel_waiter", "AAPL", 1, "first"))
+        await asyncio.sleep(0.1)
+        waiters = [asyncio.create_task(service.buy_shares("cancel_waiter", "KO", 1, f"waiter {i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        results = await asyncio.wait_for(asyncio.gather(first, *waiters[1:]), 5)
+        assert all(result.startswith("Completed") for result in results)
+        # Queued mutations are committed even if their caller stopped waiting
+        assert service.get("cancel_waiter").holdings == {"AAPL": 1, "KO": 3}
+        # And the service carries on
+        await asyncio.wait_for(service.buy_shares("cancel_waiter", "SPY", 1, "after"), 5)
+
+    with simulated_market():
+        asyncio.run(run())
+
+
+def test_concurrent_trades_from_two_processes_stay_consistent():
+    with simulated_market():
+        result = asyncio.run(stress(300))
+    assert not result["problems"], result["problems"]
+    assert result["commits"] < result["mutations"]
+
+
+def test_reading_the_report_changes_nothing():
+    async def run():
+        account = Account.get("report_test")
+        account.reset("")
+        account.buy_shares("AAPL", 3, "setup")
+        version, history = read_account_version("report_test"), read_portfolio_history("report_test")
+        for _ in range(3):
+            report = json.loads(await read_account_resource("report_test"))
+        assert report["holdings"] == {"AAPL": 3}
+        assert read_account_version("report_test") == version
+        assert read_portfolio_history("report_test") == history
+
+    with simulated_market():
+        asyncio.run(run())
@@ -0,0 +1,80 @@
+"""
+Property check for Account's running P&L aggregates: over random sequences of buys and sells at
+moving prices, the O(1) figures must match a recomputation over the full transaction history.
+
+The database is a throwaway one set up by conftest.py.
+
+Usage: uv run pytest test_accounts.py
+"""
+
+import random
+from datetime import datetime, timedelta
+import market
+from accounts import Account
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "KO"]
+SEQUENCES = 20
+TRADES = 60
+
+
+def replay(account: Account) -> tuple[dict[str, float], float]:
+    """Cost basis per holding and realized P&L, recomputed from every transaction."""
+    positions, realized = {}, 0.0
+    for trade in account.transactions:
+        held, cost = positions.get(trade.symbol, (0, 0.0))
+        if trade.quantity > 0:
+            held, cost = held + trade.quantity, cost + trade.total()
+        else:
+            average_cost = cost / held
+            realized += (trade.price - average_cost) * -trade.quantity
+            held, cost = held + trade.quantity, cost + average_cost * trade.quantity
+        positions[trade.symbol] = (held, cost if held else 0.0)
+    return {symbol: cost for symbol, (held, cost) in positions.items() if held}, realized
+
+
+def random_sequence(name: str, seed: int) -> Account:
+    rng = random.Random(seed)
+    prices = {symbol: rng.uniform(20, 400) for symbol in SYMBOLS}
+    when = datetime(2025, 6, 2, 10)
+    account = Account.get(name)
+    for _ in range(TRADES):
+        prices = {symbol: price * rng.uniform(0.9, 1.1) for symbol, price in prices.items()}
+        when += timedelta(minutes=rng.randint(1, 120))
+        market.simulate(when, prices)
+        try:
+            if account.holdings and rng.random() < 0.4:
+                symbol = rng.choice(sorted(account.holdings))
+                account.sell_shares(symbol, rng.randint(1, account.holdings[symbol]), "property")
+            else:
+                account.buy_shares(rng.choice(SYMBOLS), rng.randint(1, 10), "property")
+        except ValueError:
+            pass  # insufficient funds
+    return account
+
+
+def test_running_aggregates_match_full_history():
+    try:
+        for seed in range(SEQUENCES):
+            Account.get(f"pnl_{seed}").reset("")
+            account = random_sequence(f"pnl_{seed}", seed)
+            portfolio_value = account.calculate_portfolio_value()
+            initial_spend = sum(trade.total() for trade in account.transactions)
+            assert abs(account.calculate_profit_loss(portfolio_value) - (portfolio_value - initial_spend - account.balance)) < 1e-6
+
+            cost_basis, realized = replay(account)
+            assert account.cost_basis.keys() == cost_basis.keys()
+            assert all(abs(account.cost_basis[symbol] - cost) < 1e-6 for symbol, cost in cost_basis.items())
+            assert abs(account.realized_pnl - realized) < 1e-6
+
+            # Unrealized plus realized is the total P&L
+            prices = market.get_share_prices(list(account.holdings))
+            unrealized = sum(prices[symbol] * quantity - account.cost_basis[symbol] for symbol, quantity in account.holdings.items())
+            assert abs(unrealized + account.realized_pnl - account.calculate_profit_loss(portfolio_value)) < 1e-6
+
+            # And the stored aggregates are the ones in memory
+            stored = Account.get(account.name)
+            assert abs(stored.net_invested - account.net_invested) < 1e-6
+            assert abs(stored.realized_pnl - account.realized_pnl) < 1e-6
+            assert stored.cost_basis.keys() == account.cost_basis.keys()
+    finally:
+        market.simulate(None)
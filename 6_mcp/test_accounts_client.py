@@ -0,0 +1,110 @@
+"""
+Checks that MCPSessionManager reconnects after its server process dies, and doesn't resend a
+mutating call that may already have run. Uses a small stand-in server, so no accounts are touched.
+
+Usage: uv run pytest test_accounts_client.py  (or: uv run test_accounts_client.py)
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+from accounts_client import MCPSessionManager
+
+SERVER = """
+import os
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("test_server")
+
+@mcp.tool()
+async def pid() -> int:
+    return os.getpid()
+
+@mcp.tool()
+async def crash(marker: str) -> str:
+    with open(marker, "a") as f:
+        f.write("ran\\n")
+    os._exit(1)
+
+mcp.run(transport="stdio")
+"""
+
+
+def make_manager(directory: str) -> MCPSessionManager:
+    path = os.path.join(directory, "server.py")
+    with open(path, "w") as f:
+        f.write(SERVER)
+    return MCPSessionManager(StdioServerParameters(command=sys.executable, args=[path]), idle_timeout=60)
+
+
+async def server_pid(manager: MCPSessionManager, **kwargs) -> int:
+    result = await manager.call(lambda session: session.call_tool("pid", {}), **kwargs)
+    return int(result.content[0].text)
+
+
+def test_reconnects_after_server_is_killed():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            manager = make_manager(directory)
+            try:
+                first = await server_pid(manager)
+                assert await server_pid(manager) == first
+                os.kill(first, signal.SIGKILL)
+                await asyncio.wait_for(manager.session.lost.wait(), 10)
+                assert not manager._alive()
+                # A mutating call is safe here too, since nothing was sent to the dead server
+                second = await server_pid(manager, idempotent=False)
+                assert second != first
+                assert await server_pid(manager) == second
+            finally:
+                await manager.close()
+
+    asyncio.run(run())
+
+
+def test_call_on_a_session_that_just_died_is_retried():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            manager = make_manager(directory)
+            try:
+                first = await server_pid(manager)
+                os.kill(first, signal.SIGKILL)
+                # Don't wait for the manager to notice; the call itself finds the connection gone
+                second = await server_pid(manager)
+                assert second != first
+            finally:
+                await manager.close()
+
+    asyncio.run(run())
+
+
+def test_mutating_call_that_reached_the_server_is_not_resent():
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            manager = make_manager(directory)
+            marker = os.path.join(directory, "marker")
+            try:
+                first = await server_pid(manager)
+                try:
+                    await manager.call(lambda session: session.call_tool("crash", {"marker": marker}), idempotent=False)
+                    raise AssertionError("the call should have failed")
+                except McpError:
+                    pass
+                with open(marker) as f:
+                    assert f.read().count("ran") == 1
+                assert await server_pid(manager) != first
+            finally:
+                await manager.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,46 @@
+"""
+Checks the backtester's scripted model gives the same turns whether the agent is run or streamed.
+
+The database is a throwaway one set up by conftest.py, which also points BACKTEST_DB at it.
+
+Usage: uv run pytest test_backtest.py
+"""
+
+import asyncio
+from datetime import datetime
+from agents import Agent, Runner, set_tracing_disabled
+import market
+from accounts import Account
+from backtest import ScriptedModel, TOOLS
+
+set_tracing_disabled(True)
+
+
+def scripted_agent(name: str) -> Agent:
+    calls = [
+        ("buy_shares", {"name": name, "symbol": "AAPL", "quantity": 2, "rationale": "test"}),
+        ("buy_shares", {"name": name, "symbol": "KO", "quantity": 3, "rationale": "test"}),
+    ]
+    return Agent(name=name, instructions="Trade", model=ScriptedModel(calls), tools=TOOLS)
+
+
+def test_run_and_streamed_run_make_the_same_trades():
+    async def run():
+        Account.get("scripted_run").reset("")
+        result = await Runner.run(scripted_agent("scripted_run"), "Trade", max_turns=5)
+        assert result.final_output == "Made 2 trades today."
+
+        Account.get("scripted_stream").reset("")
+        streamed = Runner.run_streamed(scripted_agent("scripted_stream"), "Trade", max_turns=5)
+        async for _ in streamed.stream_events():
+            pass
+        assert streamed.final_output == "Made 2 trades today."
+
+        assert Account.get("scripted_run").holdings == Account.get("scripted_stream").holdings == {"AAPL": 2, "KO": 3}
+
+    market.simulate(datetime(2025, 6, 2, 10), {"AAPL": 200.0, "KO": 60.0})
+    try:
+        asyncio.run(run())
+    finally:
+        market.simulate(None)
+
@@ -0,0 +1,139 @@
+"""
+Checks database.py's transaction handling, and the log writer's batching, backpressure and shutdown.
+
+The database is a throwaway one set up by conftest.py.
+
+Usage: uv run pytest test_database.py
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+import database
+from database import LogWriter
+from events import feed
+
+INSERT_SQL = "INSERT INTO writer_test (name, message) VALUES (?, ?)"
+
+
+def test_failed_commit_rolls_back_and_forgets_its_changes():
+    conn = database.get_connection()
+    # A deferred foreign key is only checked at COMMIT, which then fails with the transaction still open
+    conn.execute("CREATE TABLE IF NOT EXISTS commit_parent (id INTEGER PRIMARY KEY)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS commit_child (parent INTEGER REFERENCES commit_parent (id) DEFERRABLE INITIALLY DEFERRED)"
+    )
+    conn.execute("PRAGMA foreign_keys = ON")
+    version = feed.version("account", "commit_test")
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            with database.transaction() as conn:
+                conn.execute("INSERT INTO commit_child (parent) VALUES (1)")
+                database.notify("account", "commit_test")
+        assert not conn.in_transaction
+        assert conn.execute("SELECT count(*) FROM commit_child").fetchone()[0] == 0
+
+        # The thread can start its next transaction, which publishes only its own changes
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO commit_parent (id) VALUES (1)")
+            conn.execute("INSERT INTO commit_child (parent) VALUES (1)")
+        assert feed.version("account", "commit_test") == version
+    finally:
+        conn.execute("PRAGMA foreign_keys = OFF")
+
+
+def written(name: str) -> int:
+    conn = database.get_connection()
+    conn.execute("CREATE TABLE IF NOT EXISTS writer_test (name TEXT, message TEXT)")
+    return conn.execute("SELECT count(*) FROM writer_test WHERE name = ?", (name,)).fetchone()[0]
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@contextmanager
+def database_locked():
+    """Hold the database's write lock from another connection, as a busy writer elsewhere would."""
+    conn = sqlite3.connect(database.DB, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    finally:
+        conn.execute("ROLLBACK")
+        conn.close()
+
+
+def stalled_writer(name: str, policy: str) -> LogWriter:
+    """A writer with room for 3 rows whose thread is stuck inserting a first row under database_locked()."""
+    writer = LogWriter(maxsize=3, batch_size=1, flush_seconds=0.01, policy=policy, insert_sql=INSERT_SQL, topic="writer_test")
+    writer.write((name, "first"))
+    wait_for(lambda: writer.queue.unfinished_tasks == 1 and writer.queue.empty())
+    for i in range(3):
+        writer.write((name, f"queued {i}"))
+    return writer
+
+
+def test_rows_are_written_in_batches():
+    written("batches")
+    writer = LogWriter(batch_size=5, flush_seconds=60, insert_sql=INSERT_SQL, topic="writer_test")
+    version = feed.version("writer_test", "batches")
+    for i in range(12):
+        writer.write(("batches", f"row {i}"))
+    # Two full batches go straight away; the last two rows wait for the batch to fill or time out
+    wait_for(lambda: written("batches") == 10)
+    time.sleep(0.1)
+    assert written("batches") == 10
+    assert feed.version("writer_test", "batches") == version + 2
+    writer.flush()
+    assert written("batches") == 12
+    writer.shutdown()
+
+
+def test_shutdown_writes_the_pending_rows():
+    written("shutdown")
+    writer = LogWriter(batch_size=100, flush_seconds=60, insert_sql=INSERT_SQL, topic="writer_test")
+    for i in range(7):
+        writer.write(("shutdown", f"row {i}"))
+    thread = writer.thread
+    writer.shutdown()
+    assert written("shutdown") == 7
+    assert not thread.is_alive()
+
+
+def test_full_queue_drops_new_rows_in_drop_mode():
+    written("drop")
+    with database_locked():
+        writer = stalled_writer("drop", "drop")
+        writer.write(("drop", "dropped 1"))
+        writer.write(("drop", "dropped 2"))
+        assert writer.dropped == 2
+    writer.shutdown()
+    assert written("drop") == 4
+
+
+def test_full_queue_waits_for_room_in_block_mode(monkeypatch):
+    monkeypatch.setattr(database, "LOG_BLOCK_TIMEOUT_SECONDS", 0.2)
+    written("block")
+    with database_locked():
+        writer = stalled_writer("block", "block")
+        start = time.perf_counter()
+        writer.write(("block", "timed out"))
+        assert time.perf_counter() - start >= 0.2
+        assert writer.dropped == 1
+
+        # A row that finds room before the timeout is kept
+        monkeypatch.setattr(database, "LOG_BLOCK_TIMEOUT_SECONDS", 5)
+        waiting = threading.Thread(target=writer.write, args=(("block", "waited"),))
+        waiting.start()
+        time.sleep(0.1)
+        assert waiting.is_alive()
+    waiting.join(5)
+    writer.shutdown()
+    assert writer.dropped == 1
+    assert written("block") == 5
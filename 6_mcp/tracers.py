@@ -1,5 +1,7 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_log, log_writer, write_span_metric, metrics_writer
+from metrics import cost_of
+from datetime import datetime
 import secrets
 import string
 
@@ -69,7 +71,62 @@ class LogTracer(TracingProcessor):
             write_log(name, type, message)
 
     def force_flush(self) -> None:
+        log_writer.flush()
+
+    def shutdown(self) -> None:
+        log_writer.shutdown()
+
+
+def token_counts(usage) -> tuple[int, int]:
+    """Input and output tokens from a usage dict (generation spans) or usage object (responses)."""
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("input_tokens") or 0, usage.get("output_tokens") or 0
+    return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+
+
+class MetricsTracer(TracingProcessor):
+    """
+    Records a structured row for every finished span of a trader's trace: its duration, and for
+    model calls the model, token counts and estimated cost, for tool calls the tool and MCP server.
+    """
+
+    get_name = LogTracer.get_name
+
+    def on_trace_start(self, trace) -> None:
         pass
 
+    def on_trace_end(self, trace) -> None:
+        pass
+
+    def on_span_start(self, span) -> None:
+        pass
+
+    def on_span_end(self, span) -> None:
+        name = self.get_name(span)
+        data = span.span_data
+        if not name or not data or not span.started_at or not span.ended_at:
+            return
+        started, ended = datetime.fromisoformat(span.started_at), datetime.fromisoformat(span.ended_at)
+        duration_ms = (ended - started).total_seconds() * 1000
+        kind, label, server, model, usage = data.type, getattr(data, "name", None) or "", None, None, None
+        if data.type == "generation":
+            model, usage = data.model, data.usage
+        elif data.type == "response" and data.response:
+            model, usage = data.response.model, data.response.usage
+        elif data.type == "function" and data.mcp_data:
+            kind, server = "mcp_tool", data.mcp_data.get("server")
+        elif data.type == "mcp_tools":
+            label = server = data.server or ""
+        if model:
+            label = model
+        input_tokens, output_tokens = token_counts(usage)
+        cost = cost_of(model, input_tokens, output_tokens)
+        write_span_metric(name, kind, label, server, duration_ms, input_tokens, output_tokens, cost)
+
+    def force_flush(self) -> None:
+        metrics_writer.flush()
+
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        metrics_writer.shutdown()
@@ -1,11 +1,12 @@
 from contextlib import AsyncExitStack
-from accounts_client import read_accounts_resource, read_strategy_resource
+from accounts_client import read_summary_resource, read_strategy_resource
+from accounts import Account
 from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
+from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, OpenAIResponsesModel, trace
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
-import json
+import asyncio
 from agents.mcp import MCPServerStdio
 from templates import (
     researcher_instructions,
@@ -15,6 +16,7 @@ from templates import (
     research_tool,
 )
 from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from rate_limits import bucket_for
 
 load_dotenv(override=True)
 
@@ -34,19 +36,45 @@ openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter
 deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
 grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
 gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
+openai_client = AsyncOpenAI()
+
+
+class RateLimitedModel:
+    """Mixin that takes a token from the provider's bucket before every model request."""
+
+    def __init__(self, *args, provider: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bucket = bucket_for(provider)
+
+    async def get_response(self, *args, **kwargs):
+        await self.bucket.acquire()
+        return await super().get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        await self.bucket.acquire()
+        async for event in super().stream_response(*args, **kwargs):
+            yield event
+
+
+class RateLimitedChatCompletionsModel(RateLimitedModel, OpenAIChatCompletionsModel):
+    pass
+
+
+class RateLimitedResponsesModel(RateLimitedModel, OpenAIResponsesModel):
+    pass
 
 
 def get_model(model_name: str):
     if "/" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
+        return RateLimitedChatCompletionsModel(model=model_name, openai_client=openrouter_client, provider="openrouter")
     elif "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        return RateLimitedChatCompletionsModel(model=model_name, openai_client=deepseek_client, provider="deepseek")
     elif "grok" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client)
+        return RateLimitedChatCompletionsModel(model=model_name, openai_client=grok_client, provider="grok")
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        return RateLimitedChatCompletionsModel(model=model_name, openai_client=gemini_client, provider="gemini")
     else:
-        return model_name
+        return RateLimitedResponsesModel(model=model_name, openai_client=openai_client, provider="openai")
 
 
 async def get_researcher(mcp_servers, model_name) -> Agent:
@@ -84,15 +112,32 @@ class Trader:
         return self.agent
 
     async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
-        account_json = json.loads(account)
-        account_json.pop("portfolio_value_time_series", None)
-        return json.dumps(account_json)
+        return await read_summary_resource(self.name)
+
+    async def get_strategy(self) -> str:
+        return await read_strategy_resource(self.name)
+
+    async def record_portfolio_value(self) -> None:
+        """Snapshot the portfolio's value at the start of each run, so the chart moves between trades."""
+
+        def record():
+            account = Account.get(self.name)
+            account.record_portfolio_value(account.calculate_portfolio_value())
+
+        await asyncio.to_thread(record)
 
-    async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
+    async def run_agent(self, trader_mcp_servers, researcher_mcp_servers, prefetched: tuple[str, str] | None = None):
+        """
+        prefetched is the (account summary, strategy) the trading floor loaded for every trader before
+        the cycle, having also recorded the portfolio value; without it, they are fetched here.
+        """
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
-        account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        if prefetched:
+            account, strategy = prefetched
+        else:
+            await self.record_portfolio_value()
+            account = await self.get_account_report()
+            strategy = await self.get_strategy()
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -100,7 +145,11 @@ class Trader:
         )
         await Runner.run(self.agent, message, max_turns=MAX_TURNS)
 
-    async def run_with_mcp_servers(self):
+    async def run_with_mcp_servers(self, fleet=None, prefetched=None):
+        if fleet:
+            # Use the long-running servers from the trading floor's fleet rather than spawning our own
+            await self.run_agent(fleet.trader_servers(), fleet.researcher_servers(self.name), prefetched)
+            return
         async with AsyncExitStack() as stack:
             trader_mcp_servers = [
                 await stack.enter_async_context(
@@ -115,17 +164,17 @@ class Trader:
                     )
                     for params in researcher_mcp_server_params(self.name)
                 ]
-                await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
+                await self.run_agent(trader_mcp_servers, researcher_mcp_servers, prefetched)
 
-    async def run_with_trace(self):
+    async def run_with_trace(self, fleet=None, prefetched=None):
         trace_name = f"{self.name}-trading" if self.do_trade else f"{self.name}-rebalancing"
         trace_id = make_trace_id(f"{self.name.lower()}")
         with trace(trace_name, trace_id=trace_id):
-            await self.run_with_mcp_servers()
+            await self.run_with_mcp_servers(fleet, prefetched)
 
-    async def run(self):
+    async def run(self, fleet=None, prefetched=None):
         try:
-            await self.run_with_trace()
+            await self.run_with_trace(fleet, prefetched)
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
         self.do_trade = not self.do_trade
@@ -1,9 +1,17 @@
 from traders import Trader
+from accounts import Account
 from typing import List
 import asyncio
-from tracers import LogTracer
+import json
+import random
+import sqlite3
+import time
+from tracers import LogTracer, MetricsTracer
 from agents import add_trace_processor
-from market import is_market_open
+from agents.mcp import MCPServerStdio
+from market import is_market_open, seconds_until_market_opens, prefetch_market_data
+from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from database import write_log, transaction, compact_logs, compact_portfolio_snapshots, prune_span_metrics
 from dotenv import load_dotenv
 import os
 
@@ -15,6 +23,16 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
 
+TRADERS_CONFIG = os.getenv("TRADERS_CONFIG")
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS", "8"))
+RUN_JITTER_SECONDS = float(os.getenv("RUN_JITTER_SECONDS", "30"))
+OVERLAP_POLICY = os.getenv("OVERLAP_POLICY", "skip").strip().lower()  # "skip" or "queue"
+
+MCP_SESSION_TIMEOUT_SECONDS = 120
+MCP_HEALTH_CHECK_TIMEOUT_SECONDS = 15
+MCP_RESTART_BACKOFF_SECONDS = 5
+MCP_RESTART_BACKOFF_MAX_SECONDS = 600
+
 names = ["Warren", "George", "Ray", "Cathie"]
 lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
 
@@ -30,6 +48,17 @@ else:
     model_names = ["gpt-4o-mini"] * 4
     short_model_names = ["GPT 4o mini"] * 4
 
+# TRADERS_CONFIG points to a JSON list of {"name", "lastname", "model_name", "short_model_name"}
+# and replaces the four default traders above
+
+if TRADERS_CONFIG:
+    with open(TRADERS_CONFIG) as f:
+        trader_config = json.load(f)
+    names = [trader["name"] for trader in trader_config]
+    lastnames = [trader.get("lastname", "Trader") for trader in trader_config]
+    model_names = [trader.get("model_name", "gpt-4o-mini") for trader in trader_config]
+    short_model_names = [trader.get("short_model_name", model) for trader, model in zip(trader_config, model_names)]
+
 
 def create_traders() -> List[Trader]:
     traders = []
@@ -38,15 +67,244 @@ def create_traders() -> List[Trader]:
     return traders
 
 
+class MCPServerFleet:
+    """
+    Starts each distinct MCP server once and keeps it running across trading cycles.
+    Servers with identical params (accounts, push, market, fetch, search) are shared by every trader;
+    per-trader servers such as the memory DB differ by params, so they are cached per trader name.
+    Each server is connected and cleaned up by its own owner task, as MCP stdio clients require,
+    so a crashed server can be torn down without disturbing the others; it is then restarted
+    with exponential backoff.
+    """
+
+    def __init__(self):
+        self.params: dict[str, dict] = {}
+        self.servers: dict[str, MCPServerStdio] = {}
+        self.owners: dict[str, tuple[asyncio.Task, asyncio.Event]] = {}
+        self.startup_seconds: dict[str, float] = {}
+        self.failures: dict[str, int] = {}
+        self.retry_at: dict[str, float] = {}
+
+    @staticmethod
+    def key(params: dict) -> str:
+        return json.dumps(params, sort_keys=True)
+
+    def server_params(self, trader: Trader) -> list[dict]:
+        return trader_mcp_server_params + researcher_mcp_server_params(trader.name)
+
+    @staticmethod
+    async def serve(server: MCPServerStdio, ready: asyncio.Future, stopping: asyncio.Event) -> None:
+        try:
+            await server.connect()
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(server)
+        try:
+            await stopping.wait()
+        finally:
+            await server.cleanup()
+
+    async def start(self, key: str) -> None:
+        if time.monotonic() < self.retry_at.get(key, 0):
+            return
+        server = MCPServerStdio(self.params[key], client_session_timeout_seconds=MCP_SESSION_TIMEOUT_SECONDS)
+        ready = asyncio.get_running_loop().create_future()
+        stopping = asyncio.Event()
+        start = time.perf_counter()
+        owner = asyncio.create_task(self.serve(server, ready, stopping))
+        try:
+            await ready
+        except Exception as e:
+            failures = self.failures.get(key, 0) + 1
+            backoff = min(MCP_RESTART_BACKOFF_SECONDS * 2 ** (failures - 1), MCP_RESTART_BACKOFF_MAX_SECONDS)
+            self.failures[key] = failures
+            self.retry_at[key] = time.monotonic() + backoff
+            print(f"Failed to start MCP server {self.params[key]['args']}: {e}; retrying in {backoff:.0f}s")
+            return
+        self.startup_seconds.setdefault(key, time.perf_counter() - start)
+        self.failures.pop(key, None)
+        self.retry_at.pop(key, None)
+        self.servers[key] = server
+        self.owners[key] = (owner, stopping)
+
+    async def stop(self, key: str) -> None:
+        self.servers.pop(key, None)
+        owner, stopping = self.owners.pop(key, (None, None))
+        if owner:
+            stopping.set()
+            for result in await asyncio.gather(owner, return_exceptions=True):
+                if isinstance(result, BaseException):
+                    print(f"Error stopping MCP server {self.params[key]['args']}: {result!r}")
+
+    async def is_healthy(self, server: MCPServerStdio) -> bool:
+        try:
+            await asyncio.wait_for(server.list_tools(), timeout=MCP_HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def prepare(self, traders: List[Trader]) -> None:
+        """Make sure every server the traders need is running, restarting any that have died."""
+        for trader in traders:
+            for params in self.server_params(trader):
+                self.params.setdefault(self.key(params), params)
+        for key in self.params:
+            if key in self.servers and not await self.is_healthy(self.servers[key]):
+                print(f"MCP server {self.params[key]['args']} is unresponsive; restarting")
+                await self.stop(key)
+            if key not in self.servers:
+                await self.start(key)
+
+    def handles(self, params_list: list[dict]) -> list[MCPServerStdio]:
+        return [self.servers[key] for key in map(self.key, params_list) if key in self.servers]
+
+    def trader_servers(self) -> list[MCPServerStdio]:
+        return self.handles(trader_mcp_server_params)
+
+    def researcher_servers(self, name: str) -> list[MCPServerStdio]:
+        return self.handles(researcher_mcp_server_params(name))
+
+    def spawn_seconds_per_cycle(self, traders: List[Trader]) -> float:
+        """Wall-clock time per-run spawning would cost: each trader starts its servers in turn, in parallel with the others."""
+        return max(
+            (sum(self.startup_seconds.get(self.key(params), 0.0) for params in self.server_params(trader)) for trader in traders),
+            default=0.0,
+        )
+
+    async def close(self) -> None:
+        for key in list(self.servers):
+            await self.stop(key)
+
+
+class Scheduler:
+    """
+    Runs a trading cycle every RUN_EVERY_N_MINUTES on a fixed clock, so slow cycles don't push later ones back.
+    At most MAX_CONCURRENT_TRADERS traders run at once, each starting after a random jitter,
+    and per-provider LLM rate limits are enforced by the traders' models.
+    If a cycle is still running when the next one is due, OVERLAP_POLICY either skips
+    the new cycle or queues it to start as soon as the current one finishes.
+    """
+
+    def __init__(self, traders: List[Trader], fleet: MCPServerFleet):
+        if OVERLAP_POLICY not in ("skip", "queue"):
+            raise ValueError(f"Unknown overlap policy {OVERLAP_POLICY}")
+        self.traders = traders
+        self.fleet = fleet
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRADERS)
+        self.durations: dict[str, float] = {}
+
+    async def warm_up(self) -> dict[str, tuple[str, str]]:
+        """
+        Before the traders start: make sure the day's prices are in the shared market store, load every
+        trader's account with one query, record each portfolio value in one commit, and prepare the
+        account summary and strategy each run starts from, keyed by lowercase name.
+        """
+
+        def load() -> tuple[int, dict[str, tuple[str, str]]]:
+            symbols = prefetch_market_data()
+            accounts = Account.get_many([trader.name for trader in self.traders])
+            values = {name: account.calculate_portfolio_value() for name, account in accounts.items()}
+            with transaction():
+                for name, account in accounts.items():
+                    account.record_portfolio_value(values[name])
+            return symbols, {name: (account.summary(), account.strategy) for name, account in accounts.items()}
+
+        try:
+            symbols, prefetched = await asyncio.to_thread(load)
+        except Exception as e:
+            print(f"Warm-up failed, so each trader will load its own account: {e}")
+            return {}
+        if symbols:
+            print(f"Market data for {symbols} symbols is ready in the market store")
+        return prefetched
+
+    async def run_trader(self, trader: Trader, prefetched: tuple[str, str] | None = None) -> None:
+        await asyncio.sleep(random.uniform(0, RUN_JITTER_SECONDS))
+        async with self.semaphore:
+            start = time.perf_counter()
+            await trader.run(self.fleet, prefetched)
+            duration = time.perf_counter() - start
+        self.durations[trader.name] = duration
+        write_log(trader.name, "scheduler", f"Run took {duration:.1f}s")
+
+    async def run_cycle(self) -> None:
+        if not (RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open()):
+            print("Market is closed, skipping run")
+            return
+        start = time.perf_counter()
+        await self.fleet.prepare(self.traders)
+        ready = time.perf_counter() - start
+        saved = self.fleet.spawn_seconds_per_cycle(self.traders) - ready
+        print(f"MCP servers ready in {ready:.1f}s, saving {saved:.1f}s of server start-up this cycle")
+        prefetched = await self.warm_up()
+        warm_up = time.perf_counter() - start
+        await asyncio.gather(*[self.run_trader(trader, prefetched.get(trader.name.lower())) for trader in self.traders])
+        agents = time.perf_counter() - start - warm_up
+        slowest = max(self.durations, key=self.durations.get, default=None)
+        print(
+            f"Cycle took {warm_up + agents:.1f}s: warm-up {warm_up:.1f}s "
+            f"(servers {ready:.1f}s, market data and accounts {warm_up - ready:.1f}s), agents {agents:.1f}s"
+            + (f"; slowest trader {slowest} ({self.durations[slowest]:.1f}s)" if slowest else "")
+        )
+
+    @staticmethod
+    async def compact_history() -> None:
+        try:
+            compacted = await asyncio.to_thread(compact_logs)
+            pruned = await asyncio.to_thread(compact_portfolio_snapshots)
+            await asyncio.to_thread(prune_span_metrics)
+        except sqlite3.Error as e:
+            print(f"History compaction failed: {e}")
+            return
+        if compacted:
+            print(f"Rolled up {compacted} log entries older than the retention period")
+        if pruned:
+            print(f"Pruned {pruned} portfolio snapshots and buckets older than their retention period")
+
+    @staticmethod
+    def report_failure(cycle: asyncio.Task) -> None:
+        if not cycle.cancelled() and cycle.exception():
+            print(f"Trading cycle failed: {cycle.exception()}")
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = RUN_EVERY_N_MINUTES * 60
+        next_run = loop.time()
+        cycle = None
+        while True:
+            if not (RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open()):
+                wait = seconds_until_market_opens()
+                print(f"Market is closed, sleeping {wait / 3600:.1f} hours until it opens")
+                await asyncio.sleep(wait)
+                next_run = loop.time()
+                continue
+            if cycle and not cycle.done():
+                if OVERLAP_POLICY == "skip":
+                    print("Previous cycle is still running, skipping this one")
+                else:
+                    print("Previous cycle is still running, queueing this one")
+                    await asyncio.gather(cycle, return_exceptions=True)
+                    cycle = None
+            if cycle is None or cycle.done():
+                await self.compact_history()
+                cycle = asyncio.create_task(self.run_cycle())
+                cycle.add_done_callback(self.report_failure)
+            next_run += interval
+            while next_run <= loop.time():
+                next_run += interval
+            await asyncio.sleep(next_run - loop.time())
+
+
 async def run_every_n_minutes():
     add_trace_processor(LogTracer())
+    add_trace_processor(MetricsTracer())
     traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    fleet = MCPServerFleet()
+    try:
+        await Scheduler(traders, fleet).run_forever()
+    finally:
+        await fleet.close()
 
 
 if __name__ == "__main__":